@@ -5,7 +5,6 @@ import traceback
 
 import graphviz
 import networkx as nx
-import stanza
 from flask import Flask, request
 from graphviz import Source
 from networkx.readwrite import json_graph
@@ -13,16 +12,12 @@ from networkx.readwrite import json_graph
 from tuw_nlp.grammar.text_to_4lang import TextTo4lang
 from tuw_nlp.graph.fourlang import FourLang
 from tuw_nlp.graph.utils import graph_to_pn
-from tuw_nlp.text.pipeline import CachedStanzaPipeline, CustomStanzaPipeline
+from tuw_nlp.text.pipeline import LANG_PIPELINES, get_pipeline
 
 HOST = "localhost"
 PORT = 5006
 app = Flask(__name__)
 
-nlp = stanza.Pipeline("en")
-
-nlp_de = CustomStanzaPipeline(processors="tokenize,pos,lemma,depparse")
-
 text_to_4lang_en = TextTo4lang("en", "en_nlp_cache")
 text_to_4lang_de = TextTo4lang("de", "de_nlp_cache")
 
@@ -63,13 +58,13 @@ def build():
             fl = fl_graphs[0]
             if int(depth):
                 text_to_4lang_en.expand(fl, depth=int(depth), substitute=substitute)
-            sen = nlp(text).sentences[0]
+            sen = get_pipeline(**LANG_PIPELINES["en"])(text).sentences[0]
         elif lang == "de":
             fl_graphs = list(text_to_4lang_de(text))
             fl = fl_graphs[0]
             if int(depth):
                 text_to_4lang_de.expand(fl, depth=int(depth), substitute=substitute)
-            sen = nlp_de(text).sentences[0]
+            sen = get_pipeline(**LANG_PIPELINES["de"])(text).sentences[0]
         ret_value["result"]["ud"] = visualize(sen).source
         if fl:
             if append_zero_graph:
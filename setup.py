@@ -37,7 +37,7 @@ setup(
     install_requires=[
         "dict-recursive-update",
         "networkx",
-        "penman",
+        "penman>=1.3.1,<1.4",
         "stanza==1.3.0",
         "nltk",
         "graphviz",
@@ -0,0 +1,45 @@
+import pickle
+import sqlite3
+import threading
+import time
+
+from tuw_nlp.common.kvstore import KVStore
+
+
+def test_kvstore(tmp_path):
+    store = KVStore(str(tmp_path / "store.db"))
+    store.put("foo", "bar")
+    store.update([("baz", b"\x00\x01"), ("foo", "qux")])
+    assert store.get("foo") == "qux"
+    assert store.get("baz") == b"\x00\x01"
+    assert store.get("missing") is None
+    assert "baz" in store
+    assert len(store) == 2
+
+    copied = pickle.loads(pickle.dumps(store))
+    assert sorted(copied.keys()) == ["baz", "foo"]
+
+
+def test_kvstore_concurrent_update(tmp_path):
+    fn = str(tmp_path / "store.db")
+    KVStore(fn).put("foo", "bar")
+    locked = threading.Event()
+
+    def write():
+        conn = sqlite3.connect(fn, isolation_level=None)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("INSERT OR REPLACE INTO store (key, value) VALUES ('foo', 'baz')")
+        locked.set()
+        time.sleep(0.5)
+        conn.execute("COMMIT")
+        conn.close()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    locked.wait()
+    # the update waits for the other writer instead of failing
+    store = KVStore(fn, timeout=10)
+    store.update([("foo", "qux"), ("x", "y")])
+    thread.join()
+    assert store.get("foo") == "qux"
+    assert len(store) == 2
@@ -0,0 +1,84 @@
+import os
+import sys
+
+os.environ.setdefault("ALTO_JAR", "alto.jar")
+
+from tuw_nlp.grammar import alto  # noqa: E402
+from tuw_nlp.grammar.alto import AltoWorker  # noqa: E402
+
+# stands in for AltoServer.java: the content of the input file says what to do
+STUB_SERVER = """
+import sys, time
+for line in sys.stdin:
+    args = line.rstrip("\\n").split("\\t")
+    command = open(args[0]).read().strip()
+    if command == "crash":
+        sys.exit(1)
+    elif command == "sleep":
+        time.sleep(60)
+    elif command == "error":
+        print("ERROR failed", flush=True)
+    elif command == "exit":
+        open(args[args.index("-o") + 1], "w").write(command)
+        sys.exit(0)
+    else:
+        open(args[args.index("-o") + 1], "w").write(command)
+        print("OK", flush=True)
+"""
+
+
+def run(worker, tmp_path, command):
+    input_fn, output_fn = str(tmp_path / "input.txt"), str(tmp_path / "output.txt")
+    if os.path.exists(output_fn):
+        os.remove(output_fn)
+    with open(input_fn, "w") as f:
+        f.write(command)
+    return worker.run(input_fn, "grammar.irtg", output_fn, "ud", "fl", "codec")
+
+
+def test_alto_worker(tmp_path, monkeypatch):
+    stub_fn = str(tmp_path / "stub_server.py")
+    with open(stub_fn, "w") as f:
+        f.write(STUB_SERVER)
+    monkeypatch.setattr(
+        alto, "get_alto_server_command", lambda memory: [sys.executable, stub_fn]
+    )
+
+    with AltoWorker(timeout=2, max_requests=3) as worker:
+        assert run(worker, tmp_path, "graph")
+        pid = worker.proc.pid
+        assert run(worker, tmp_path, "graph")
+        assert worker.proc.pid == pid
+        assert not run(worker, tmp_path, "error")
+        assert worker.proc.pid == pid
+
+        # restarted after max_requests
+        assert run(worker, tmp_path, "graph")
+        assert worker.proc.pid != pid
+
+        assert not run(worker, tmp_path, "sleep")
+        assert worker.proc is None
+        assert run(worker, tmp_path, "graph")
+
+        assert not run(worker, tmp_path, "crash")
+        assert not worker.is_alive()
+        assert run(worker, tmp_path, "graph")
+        assert worker.is_alive()
+
+        # exiting normally after writing the output is not a failure
+        assert run(worker, tmp_path, "exit")
+        assert not worker.is_alive()
+        assert run(worker, tmp_path, "graph")
+
+    assert worker.proc is None
+    assert not worker.is_alive()
+
+
+def test_get_alto_command(monkeypatch):
+    args = ("input.txt", "grammar.irtg", "output.txt", "ud", "fl", "codec")
+    monkeypatch.setattr(alto.shutil, "which", lambda cmd: "/usr/bin/timeout")
+    command = alto.get_alto_command(*args, timeout=5)
+    assert command[:3] == ["timeout", "5", "java"]
+
+    monkeypatch.setattr(alto.shutil, "which", lambda cmd: None)
+    assert alto.get_alto_command(*args, timeout=5)[0] == "java"
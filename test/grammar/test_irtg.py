@@ -0,0 +1,126 @@
+import os
+
+os.environ.setdefault("ALTO_JAR", "alto.jar")
+
+from tuw_nlp.grammar import irtg  # noqa: E402
+from tuw_nlp.grammar.irtg import IRTGCache, IRTGGrammar  # noqa: E402
+
+
+class WordGrammar(IRTGGrammar):
+    """Parses a one-word tree into a graph with a single node"""
+
+    interpretations = {
+        "ud": "de.up.ling.irtg.algebra.TreeWithAritiesAlgebra",
+        "fl": "de.up.ling.irtg.algebra.graph.GraphAlgebra",
+    }
+
+    def preprocess_input(self, word, **kwargs):
+        self.word = word
+        return f"root({word})"
+
+    def postprocess_output(self, output_obj, **kwargs):
+        return output_obj
+
+    def gen_rules(self):
+        yield (
+            "S! -> root(W)",
+            {"ud": "root_1(?1)", "fl": "?1"},
+            "nonterminal",
+        )
+        yield (
+            f"W -> {self.word}",
+            {"ud": self.word, "fl": f"(u / {self.word})"},
+            "terminal",
+        )
+
+
+def fake_run_alto(calls):
+    """Stands in for run_alto: fails on inputs containing 'bad', otherwise
+    writes an output for every input line"""
+
+    def run_alto(input_fn, grammar_fn, output_fn, *args):
+        with open(input_fn) as f:
+            lines = [line.strip() for line in f if line.strip()]
+        inputs = [line for line in lines if not line.startswith("#")][:-1]
+        calls.append(inputs)
+        if any("bad" in line for line in inputs):
+            return False
+        with open(output_fn, "w") as f:
+            for line in inputs:
+                f.write(f"deriv\n{line}\n")
+        return True
+
+    return run_alto
+
+
+def get_grammar(tmp_path, monkeypatch):
+    monkeypatch.setenv("TUWNLP_TMPDIR", str(tmp_path / "tmp"))
+    return WordGrammar(cache_dir=str(tmp_path / "cache"))
+
+
+def test_gen_batch_rules(tmp_path, monkeypatch):
+    grammar = get_grammar(tmp_path, monkeypatch)
+    grammar.preprocess_input("dog")
+    rules = list(grammar.gen_batch_rules(3, list(grammar.gen_rules()), "ud"))
+    assert [rule for rule, _, _ in rules] == [
+        "S! -> batch3(s3_S)",
+        "s3_S -> s3_root(s3_W)",
+        "s3_W -> s3_dog",
+    ]
+    assert rules[0][1] == {"ud": "batch3_1(?1)", "fl": "?1"}
+    assert rules[2][1] == {"ud": "dog", "fl": "(u / dog)"}
+
+
+def test_parse_batch_fallback(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(irtg, "run_alto", fake_run_alto(calls))
+    grammar = get_grammar(tmp_path, monkeypatch)
+
+    outputs = grammar.parse_batch(["dog", "bad", "cat", "dog"], "ud", "fl", "codec")
+    assert outputs == ["root(dog)", None, "root(cat)", "root(dog)"]
+    # one failed batch, then each distinct input on its own
+    assert calls == [
+        ["batch0(root(dog))", "batch1(root(bad))", "batch2(root(cat))"],
+        ["root(dog)"],
+        ["root(bad)"],
+        ["root(cat)"],
+    ]
+
+
+def test_parse_batch(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(irtg, "run_alto", fake_run_alto(calls))
+    grammar = get_grammar(tmp_path, monkeypatch)
+
+    outputs = grammar.parse_batch(["dog", "cat"], "ud", "fl", "codec")
+    assert outputs == ["batch0(root(dog))", "batch1(root(cat))"]
+    assert len(calls) == 1
+    # cached outputs are not parsed again
+    assert grammar.parse_batch(["cat"], "ud", "fl", "codec") == outputs[1:]
+    assert len(calls) == 1
+
+
+def test_legacy_json_cache(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(irtg, "run_alto", fake_run_alto(calls))
+    json_fn = str(tmp_path / "cache" / "WordGrammar.json")
+    os.makedirs(tmp_path / "cache")
+    legacy = IRTGCache(["fl", "ud"], json_fn, new=True)
+    legacy.add("root(dog)", "ud", "fl", "codec", "(u / old_dog)")
+    legacy.update_file(json_fn)
+
+    grammar = get_grammar(tmp_path, monkeypatch)
+    assert grammar.cache_fn == str(tmp_path / "cache" / "WordGrammar.db")
+    assert list(grammar.cache.gen_entries()) == [
+        ("root(dog)", "ud", "fl", "codec", "(u / old_dog)")
+    ]
+    outputs = grammar.parse_batch(["dog", "cat"], "ud", "fl", "codec")
+    assert outputs == ["(u / old_dog)", "batch0(root(cat))"]
+    assert calls == [["batch0(root(cat))"]]
+
+    # the JSON cache is only imported into a new SQLite cache
+    legacy.add("root(bird)", "ud", "fl", "codec", "(u / old_bird)")
+    legacy.update_file(json_fn)
+    grammar = get_grammar(tmp_path, monkeypatch)
+    assert grammar.cache.get("root(bird)", "ud", "fl", "codec") is None
+    assert grammar.cache.get("root(cat)", "ud", "fl", "codec") == "batch0(root(cat))"
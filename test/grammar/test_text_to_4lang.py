@@ -0,0 +1,235 @@
+import os
+from types import SimpleNamespace
+
+import networkx as nx
+
+os.environ.setdefault("ALTO_JAR", "alto.jar")
+
+from tuw_nlp.grammar import text_to_4lang  # noqa: E402
+from tuw_nlp.grammar.text_to_4lang import (  # noqa: E402
+    DefinitionCache,
+    TextTo4lang,
+    gen_pn_lines,
+    parse_parallel,
+)
+from tuw_nlp.graph.fourlang import FourLang  # noqa: E402
+from tuw_nlp.graph.lexical import LexGraphs  # noqa: E402
+
+
+class StubNLP:
+    """Parses each word of a text into a one-word sentence"""
+
+    def __call__(self, text):
+        return SimpleNamespace(
+            sentences=[SimpleNamespace(text=w) for w in text.split()]
+        )
+
+    def pipe(self, texts, batch_size=None):
+        for text in texts:
+            yield self(text)
+
+
+class StubUDFL:
+    """Returns the graph of a sentence from fls, a single node named after
+    the sentence by default. Fails on sentences that are "bad", like a
+    grammar missing a rule."""
+
+    def __init__(self, fls=None):
+        self.fls = fls or {}
+        self.calls = []
+
+    def get_fl(self, text):
+        return self.fls.get(text, f"(u_1 / {text})")
+
+    def parse(self, sen, *args):
+        self.calls.append([sen.text])
+        if sen.text == "bad":
+            raise KeyError(sen.text)
+        return self.get_fl(sen.text)
+
+    def parse_batch(self, sens, *args):
+        self.calls.append([sen.text for sen in sens])
+        if any(sen.text == "bad" for sen in sens):
+            raise KeyError("bad")
+        return [self.get_fl(sen.text) for sen in sens]
+
+
+class StubLexicon:
+    def __init__(self, definitions, stopwords=()):
+        self.definitions = definitions
+        self.stopwords = set(stopwords)
+
+    def get_definition(self, word):
+        return self.definitions.get(word)
+
+
+def make_tfl(fls=None, definitions=None, stopwords=()):
+    tfl = TextTo4lang.__new__(TextTo4lang)
+    tfl.lang = "en"
+    tfl.nlp = StubNLP()
+    tfl.ud_fl = StubUDFL(fls)
+    tfl.lexicon = StubLexicon(definitions or {}, stopwords)
+    tfl.definition_cache = DefinitionCache()
+    tfl.definition_graph = None
+    tfl.graph_lexical = LexGraphs()
+    return tfl
+
+
+def test_parse_definitions():
+    tfl = make_tfl()
+    words_definitions = [("dog", "animal"), ("x", "bad"), ("cat", "pet")]
+    fls = tfl.parse_definitions(words_definitions, batch_size=2)
+    assert fls == {
+        ("dog", "animal"): "(u_1 / animal)",
+        ("x", "bad"): None,
+        ("cat", "pet"): "(u_1 / pet)",
+    }
+    # the failed batch is parsed again one definition at a time
+    assert tfl.ud_fl.calls == [["animal", "bad"], ["animal"], ["bad"], ["pet"]]
+    assert DefinitionCache.get_key("en", "dog", "animal") in tfl.definition_cache
+    assert DefinitionCache.get_key("en", "x", "bad") not in tfl.definition_cache
+
+    # empty definitions have no sentences
+    tfl.ud_fl.calls = []
+    fls = tfl.parse_definitions(words_definitions + [("y", ""), ("z", "wolf")])
+    assert fls[("y", "")] is None
+    assert fls[("z", "wolf")] == "(u_1 / wolf)"
+    assert tfl.ud_fl.calls == [["bad"], ["wolf"]]
+
+
+SENTENCE = "(u_1 / like :1 (u_2 / dog) :2 (u_3 / the :0 (u_4 / cat)))"
+DEFINITIONS = {
+    "like": "like_def",
+    "dog": "dog_def",
+    "cat": "cat_def",
+    "the": "the_def",
+    "animal": "animal_def",
+    "bark": "bark_def",
+    "living": "living_def",
+}
+DEFINITION_FLS = {
+    "like_def": "(u_1 / feel :0 (u_2 / good))",
+    "dog_def": "(u_1 / animal :1-of (u_2 / bark))",
+    "cat_def": "(u_1 / animal :0 (u_2 / pet))",
+    "the_def": "(u_1 / article)",
+    "animal_def": "(u_1 / living :0 (u_2 / thing))",
+    "bark_def": "(u_1 / sound)",
+    "living_def": "(u_1 / alive)",
+}
+
+
+def recursive_expand(tfl, graph, depth, substitute, expand_set, strategy):
+    """The node by node expansion that expand replaced"""
+    if depth == 0:
+        return
+    if not expand_set:
+        nodes = [(node, dict(data)) for node, data in graph.G.nodes(data=True)]
+    else:
+        nodes = [
+            (node, dict(data))
+            for node, data in graph.G.nodes(data=True)
+            if data["name"] in expand_set
+        ]
+    for d_node, node_data in nodes:
+        if all(elem not in node_data for elem in ["expanded", "substituted"]):
+            node = graph.d_clean(node_data["name"]).split("_")[0]
+            if node not in tfl.lexicon.stopwords or d_node == graph.root:
+                definition = tfl.lexicon.get_definition(node)
+                if definition:
+                    definition_nodes = tfl.add_definition(
+                        graph, d_node, definition, substitute, strategy, node
+                    )
+                    if expand_set:
+                        expand_set |= set(definition_nodes)
+    recursive_expand(tfl, graph, depth - 1, substitute, expand_set, strategy)
+
+
+def expand_sentence(expand, depth, substitute, expand_set, strategy):
+    tfl = make_tfl(DEFINITION_FLS, DEFINITIONS, stopwords=["the"])
+    graph = FourLang(*tfl.fl_to_graph(SENTENCE), tfl.graph_lexical)
+    expand(tfl, graph, depth, substitute, set(expand_set), strategy)
+    vocab = tfl.graph_lexical.vocab
+    G = nx.relabel_nodes(graph.G, vocab.get_word)
+    return (
+        sorted(G.nodes(data=True)),
+        sorted(G.edges(data="color")),
+        vocab.get_word(graph.root),
+        tfl.ud_fl.calls,
+    )
+
+
+def test_expand():
+    def level_expand(tfl, graph, depth, substitute, expand_set, strategy):
+        tfl.expand(graph, depth, substitute, expand_set, strategy)
+
+    for depth in range(4):
+        for substitute in (False, True):
+            for expand_set in ((), ("dog",), ("like", "the")):
+                for strategy in ("None", "whitelisting"):
+                    args = depth, substitute, expand_set, strategy
+                    nodes, edges, root, calls = expand_sentence(level_expand, *args)
+                    expected = expand_sentence(recursive_expand, *args)
+                    assert (nodes, edges, root) == expected[:3]
+                    # each level is parsed in one batch
+                    assert len(calls) <= depth
+                    assert sorted(sum(calls, [])) == sorted(sum(expected[3], []))
+
+    # the nodes expanded at each level
+    _, _, _, calls = expand_sentence(level_expand, 3, False, (), "None")
+    assert calls == [
+        ["like_def", "dog_def", "cat_def"],
+        ["animal_def", "bark_def"],
+        ["living_def"],
+    ]
+    nodes, edges, _, calls = expand_sentence(level_expand, 2, False, ("dog",), "None")
+    assert calls == [["dog_def"], ["animal_def", "bark_def"]]
+    assert [node for node, data in nodes if data.get("expanded")] == [
+        "animal",
+        "bark",
+        "dog",
+    ]
+    assert ("dog", "animal", 0) in edges and ("animal", "living", 0) in edges
+
+
+class StubTextTo4lang:
+    """Turns each text into a chain of its words, fails on texts with "bad" """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        pass
+
+    def pipe(self, texts, batch_size=32):
+        for text in texts:
+            if "bad" in text:
+                yield None
+                continue
+            words = text.split()
+            G = nx.DiGraph()
+            G.add_nodes_from((i, {"name": word}) for i, word in enumerate(words))
+            G.add_edges_from((i, i + 1, {"color": 0}) for i in range(len(words) - 1))
+            yield [FourLang(G, 0)]
+
+
+def test_parse_parallel(monkeypatch):
+    monkeypatch.setattr(text_to_4lang, "TextTo4lang", StubTextTo4lang)
+    texts = [f"text {i} {'bad' if i % 7 == 3 else 'good'}" for i in range(50)]
+    expected = list(gen_pn_lines(StubTextTo4lang(), texts, 4))
+    assert expected[0] == "(u_0 / text  :0 (u_1 / 0  :0 (u_2 / good)))"
+    assert expected[3] is None
+
+    args = SimpleNamespace(
+        workers=2,
+        lang="en",
+        nlp_cache=None,
+        cache_dir=None,
+        persistent_alto=False,
+        definition_cache=None,
+        definition_graph=None,
+        batch_size=4,
+    )
+    assert list(parse_parallel(iter(texts), args)) == expected
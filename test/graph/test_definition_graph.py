@@ -0,0 +1,39 @@
+from tuw_nlp.graph.definition_graph import DefinitionGraph
+from tuw_nlp.graph.lexical import LexGraphs
+from tuw_nlp.graph.utils import pn_to_graph
+
+DEFINITIONS = [
+    (
+        "like",
+        "(k_4<root> / like  :2 (k_6 / eat  :2 (k_7 / sausage))  :1 (k_3 / dog  :2-of (u_12 / HAS  :1 (k_1 / Adam))))",  # noqa
+    ),
+    ("dog", "(u_1<root> / animal :0 (u_2 / bark) :FOO (u_3 / animal))"),
+    ("x", "(u_1 / x)"),
+]
+
+
+def test_definition_graph(tmp_path):
+    fn = str(tmp_path / "definitions.npz")
+    DefinitionGraph.from_penman(DEFINITIONS).save(fn)
+    definition_graph = DefinitionGraph.load(fn)
+    assert len(definition_graph) == 3
+    assert "cat" not in definition_graph
+
+    lexical = LexGraphs()
+    lexical.vocab.add("cat")
+    for word, fl in DEFINITIONS:
+        graph, root = pn_to_graph(fl)
+        expected = lexical.from_plain(graph)
+        G, G_root = definition_graph.get_graph(word, lexical)
+        assert list(G.nodes(data=True)) == list(expected.nodes(data=True))
+        assert list(G.edges(data=True)) == list(expected.edges(data=True))
+        assert G_root == lexical.vocab.get_id(graph.nodes[root]["name"])
+
+
+def test_save_without_suffix(tmp_path):
+    fn = str(tmp_path / "definitions.graph")
+    DefinitionGraph.from_penman(DEFINITIONS).save(fn)
+    assert not (tmp_path / "definitions.graph.npz").exists()
+    definition_graph = DefinitionGraph.load(fn)
+    assert len(definition_graph) == 3
+    assert "dog" in definition_graph
@@ -0,0 +1,106 @@
+import networkx as nx
+
+from tuw_nlp.graph.fourlang import FourLang
+
+
+def make_graph(nodes, edges):
+    G = nx.DiGraph()
+    for node, name in nodes.items():
+        G.add_node(node, name=name)
+    G.add_edges_from((u, v, {"color": color}) for u, v, color in edges)
+    return G
+
+
+def test_append_zero_paths():
+    nodes = {1: "dog", 2: "animal", 3: "living", 4: "bark", 5: "cat", 6: "sound"}
+    # animal and living form a cycle of 0 edges
+    edges = [
+        (1, 2, 0),
+        (2, 3, 0),
+        (3, 2, 0),
+        (4, 1, 1),
+        (1, 5, 2),
+        (4, 6, 0),
+        (3, 6, 2),
+    ]
+    fourlang = FourLang(make_graph(nodes, edges), 1)
+    fourlang.append_zero_paths()
+    assert sorted(fourlang.G.edges(data="color")) == sorted(
+        edges + [(1, 3, 0), (1, 6, 2), (2, 6, 2), (4, 2, 1), (4, 3, 1)]
+    )
+
+    assert fourlang.find_zero_paths(1)[1] == [2, 3]
+    assert fourlang.find_zero_paths(4)[1] == [6]
+    assert fourlang.find_zero_paths(5)[1] == []
+
+
+def make_sentence():
+    # bark :1 dog, dog :0 big
+    nodes = {1: "dog", 2: "bark", 3: "big"}
+    return FourLang(make_graph(nodes, [(2, 1, 1), (1, 3, 0)]), 1)
+
+
+def make_definition():
+    # animal :0 big, animal :2-of (HAS :1 fur)
+    nodes = {10: "animal", 3: "big", 11: "HAS", 12: "fur"}
+    edges = [(10, 3, 2), (11, 10, 1), (11, 12, 2)]
+    return FourLang(make_graph(nodes, edges), 10)
+
+
+def test_merge_definition_graph():
+    fourlang = make_sentence()
+    definition = make_definition()
+    fourlang.merge_definition_graph(definition, 1)
+    assert sorted(fourlang.G.edges(data="color")) == [
+        (1, 3, 0),
+        (1, 10, 0),
+        (2, 1, 1),
+        (10, 3, 2),
+        (11, 10, 1),
+        (11, 12, 2),
+    ]
+    assert fourlang.G.nodes[1] == {"name": "dog", "expanded": True}
+    assert fourlang.root == 1
+    # the definition graph is not modified
+    assert sorted(definition.G.edges) == [(10, 3), (11, 10), (11, 12)]
+
+
+def test_merge_definition_graph_substitute():
+    fourlang = make_sentence()
+    fourlang.merge_definition_graph(make_definition(), 1, substitute=True)
+    # the edges of dog are moved to animal, except for animal -> big, which
+    # keeps its color from the definition
+    assert sorted(fourlang.G.edges(data="color")) == [
+        (2, 10, 1),
+        (10, 3, 2),
+        (11, 10, 1),
+        (11, 12, 2),
+    ]
+    assert 1 not in fourlang.G
+    assert fourlang.G.nodes[10] == {"name": "animal", "substituted": True}
+    assert fourlang.root == 10
+
+
+def test_merge_many():
+    fourlang = make_sentence()
+    # bark :0 sound
+    bark = FourLang(make_graph({20: "sound"}, []), 20)
+    no_root = FourLang(make_graph({30: "x"}, []))
+    fourlang.merge_many(
+        [(make_definition(), 1), (bark, 2), (no_root, 3)], substitute=True
+    )
+    assert sorted(fourlang.G.edges(data="color")) == [
+        (10, 3, 2),
+        (11, 10, 1),
+        (11, 12, 2),
+        (20, 10, 1),
+    ]
+    assert sorted(fourlang.G.nodes) == [3, 10, 11, 12, 20]
+    assert fourlang.root == 10
+
+    fourlang = make_sentence()
+    fourlang.merge_many([(make_definition(), 1), (bark, 2), (no_root, 3)])
+    assert (1, 10, 0) in fourlang.G.edges(data="color")
+    assert (2, 20, 0) in fourlang.G.edges(data="color")
+    assert 30 not in fourlang.G
+    assert [n for n, e in fourlang.G.nodes(data="expanded") if e] == [1, 2]
@@ -0,0 +1,70 @@
+import networkx as nx
+
+from tuw_nlp.graph.lexical import LexGraphs
+from tuw_nlp.graph.utils import gen_connected_edge_sets
+
+EDGES = [(0, 1), (1, 0), (0, 2), (2, 3), (4, 5)]
+
+EDGE_SETS = {
+    1: [{0}, {1}, {2}, {3}, {4}],
+    2: [{0, 1}, {0, 2}, {1, 2}, {2, 3}],
+    3: [{0, 1, 2}, {0, 2, 3}, {1, 2, 3}],
+}
+
+CYCLE = (("animal", (("dog", 2),)), ("dog", (("animal", 0),)))
+
+SUBGRAPHS = {
+    (("animal", ()),),
+    (("bark", ()),),
+    (("dog", ()),),
+    (("sound", ()),),
+    (("animal", ()), ("dog", (("animal", 0),))),
+    (("animal", (("dog", 2),)), ("dog", ())),
+    (("bark", ()), ("dog", (("bark", 1),))),
+    (("bark", (("sound", 2),)), ("sound", ())),
+    CYCLE,
+    (("animal", ()), ("bark", ()), ("dog", (("animal", 0), ("bark", 1)))),
+    (("animal", (("dog", 2),)), ("bark", ()), ("dog", (("bark", 1),))),
+    (("bark", (("sound", 2),)), ("dog", (("bark", 1),)), ("sound", ())),
+}
+
+
+def test_gen_connected_edge_sets():
+    for n in EDGE_SETS:
+        edge_sets = list(gen_connected_edge_sets(EDGES, n))
+        assert len(edge_sets) == len(set(edge_sets))
+        expected = [set(s) for size in range(1, n + 1) for s in EDGE_SETS[size]]
+        assert sorted(map(sorted, edge_sets)) == sorted(map(sorted, expected))
+
+
+def make_graph():
+    G = nx.DiGraph()
+    for node, name in enumerate(("dog", "animal", "bark", "sound")):
+        G.add_node(node, name=name)
+    G.add_edge(0, 1, color=0)
+    G.add_edge(1, 0, color=2)
+    G.add_edge(0, 2, color=1)
+    G.add_edge(2, 3, color=2)
+    G.add_edge(3, 3, color=0)
+    return G
+
+
+def test_gen_lex_subgraph_tuples():
+    lexgraphs = LexGraphs()
+
+    def to_names(sg_tuple):
+        get_word = lexgraphs.vocab.get_word
+        return tuple(
+            sorted(
+                (get_word(node), tuple(sorted((get_word(v), c) for v, c in out)))
+                for node, out in sg_tuple
+            )
+        )
+
+    tuples = list(lexgraphs.gen_lex_subgraph_tuples(make_graph(), 2))
+    assert len(tuples) == len(set(tuples))
+    assert {to_names(t) for t in tuples} == SUBGRAPHS
+
+    # gen_lex_subgraphs produces the same tuples, except that it drops cycles
+    old_tuples = {t for t, _ in lexgraphs.gen_lex_subgraphs(make_graph(), 2)}
+    assert {to_names(t) for t in old_tuples} == SUBGRAPHS - {CYCLE}
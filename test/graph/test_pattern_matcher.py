@@ -0,0 +1,140 @@
+import networkx as nx
+
+from tuw_nlp.graph.utils import GraphFormulaPatternMatcher, pn_to_graph
+
+GRAPHS = [
+    "(u_1 / like :2 (u_2 / eat :2 (u_3 / sausage)) :1 (u_4 / Dog :0 (u_5 / animal)))",
+    "(u_1 / hate :2 (u_2 / cat :0 (u_3 / animal)) :1 (u_4 / dog :0 (u_5 / animal)))",
+    "(u_1 / big :0-of (u_2 / dog :1-of (u_3 / bark :0 (u_4 / sound))))",
+    "(u_1 / dogs :0 (u_2 / animal :0 (u_3 / living :0 (u_4 / thing))))",
+    "(u_1 / eat :1 (u_2 / cat) :2 (u_3 / fish :0 (u_4 / animal)))",
+]
+
+PATTERNS = [
+    (["(u_1 / dog)"], [], "dog"),
+    (["(u_1 / dog :0 (u_2 / animal))"], [], "dog_animal"),
+    (["(u_1 / dog :0 (u_2 / animal))"], ["(u_1 / hate)"], "dog_not_hate"),
+    (["(u_1 / cat|dog)"], ["(u_1 / eat :2 (u_2 / fish))"], "pet_not_fish"),
+    (["(u_1 / anim.*)"], [], "regex_prefix"),
+    (["(u_1 / .* :0 (u_2 / animal))"], [], "regex_any"),
+    (["(u_1 / eat :1|2 (u_2 / cat))"], [], "regex_edge"),
+    (["(u_1 / like)", "(u_1 / eat)"], [], "like_eat"),
+    (["2((u_1 / like),(u_2 / sausage))"], [], "distance_2"),
+    (["1((u_1 / like),(u_2 / sausage))"], [], "distance_1"),
+    (["2((u_1 / animal),(u_2 / thing))"], [], "distance_animal"),
+    (["2((u_1 / bark),(u_2 / big))"], [], "distance_reverse"),
+    (["path((u_1 / bark),(u_2 / big))"], [], "path"),
+    (["path((u_1 / big),(u_2 / bark))"], [], "path_reverse"),
+    (["undirected((u_1 / big),(u_2 / bark))"], [], "undirected"),
+    (["undirected((u_1 / cat),(u_2 / dog))"], ["(u_1 / like)"], "undirected_neg"),
+]
+
+
+class BaselineMatcher(GraphFormulaPatternMatcher):
+    """Matches with the DiGraphMatcher and node_matcher/edge_matcher path
+    and recomputes every distance, without filtering candidates"""
+
+    def get_candidates(self, graph):
+        return range(len(self.patts))
+
+    def get_compiled_matcher(self, graph, pattern):
+        return GraphFormulaPatternMatcher.get_matcher(
+            graph, pattern, self.case_sensitive
+        )
+
+    def undirected(self, graph, nodes, subgraphs):
+        return self.path_between(graph.to_undirected().to_directed(), nodes, subgraphs)
+
+    def is_within_distance(self, graph, source, target, max_dist=None):
+        try:
+            distance = nx.shortest_path_length(graph, source, target)
+        except nx.NetworkXNoPath:
+            return False
+        return max_dist is None or distance <= max_dist
+
+
+def get_subgraph_data(subgraphs):
+    return [
+        (sorted(sg.nodes(data=True)), sorted(sg.edges(data=True))) for sg in subgraphs
+    ]
+
+
+def get_matches(matcher, graph):
+    return [
+        (key, i, get_subgraph_data(subgraphs))
+        for key, i, subgraphs in matcher.match(graph, return_subgraphs=True)
+    ]
+
+
+def test_matcher_equivalence():
+    graphs = [pn_to_graph(pn)[0] for pn in GRAPHS]
+    for case_sensitive in (False, True):
+        matcher = GraphFormulaPatternMatcher(PATTERNS, pn_to_graph, case_sensitive)
+        baseline = BaselineMatcher(PATTERNS, pn_to_graph, case_sensitive)
+        for graph in graphs:
+            assert get_matches(matcher, graph) == get_matches(baseline, graph)
+
+        corpus_matches = [
+            (graph_idx, key, i) for graph_idx, key, i, _ in matcher.match_corpus(graphs)
+        ]
+        expected = [
+            (graph_idx, key, i)
+            for graph_idx, graph in enumerate(graphs)
+            for key, i in baseline.match(graph)
+        ]
+        assert corpus_matches == expected
+
+
+def test_match_corpus_parallel():
+    graphs = [pn_to_graph(pn)[0] for pn in GRAPHS] * 3
+    matcher = GraphFormulaPatternMatcher(PATTERNS, pn_to_graph)
+    serial = [
+        (graph_idx, key, i, get_subgraph_data(subgraphs))
+        for graph_idx, key, i, subgraphs in matcher.match_corpus(graphs)
+    ]
+    assert len({graph_idx for graph_idx, _, _, _ in serial}) == len(graphs)
+    for chunksize in (1, 2, 100):
+        parallel = [
+            (graph_idx, key, i, get_subgraph_data(subgraphs))
+            for graph_idx, key, i, subgraphs in matcher.match_corpus(
+                graphs, n_jobs=2, chunksize=chunksize
+            )
+        ]
+        assert parallel == serial
+
+
+EXPECTED_KEYS = [
+    [
+        "distance_2",
+        "dog",
+        "dog_animal",
+        "dog_not_hate",
+        "like_eat",
+        "pet_not_fish",
+        "regex_any",
+        "regex_prefix",
+    ],
+    [
+        "dog",
+        "dog_animal",
+        "pet_not_fish",
+        "regex_any",
+        "regex_prefix",
+        "undirected_neg",
+    ],
+    ["distance_reverse", "dog", "path", "pet_not_fish", "undirected"],
+    ["distance_animal", "regex_any", "regex_prefix"],
+    ["regex_any", "regex_edge", "regex_prefix"],
+]
+
+
+def test_matcher_keys():
+    graphs = [pn_to_graph(pn)[0] for pn in GRAPHS]
+    for case_sensitive in (False, True):
+        matcher = GraphFormulaPatternMatcher(PATTERNS, pn_to_graph, case_sensitive)
+        keys = [sorted(key for key, _ in matcher.match(graph)) for graph in graphs]
+        expected = list(EXPECTED_KEYS)
+        if case_sensitive:
+            # "Dog" is not matched by "dog"
+            expected[0] = ["distance_2", "like_eat", "regex_any", "regex_prefix"]
+        assert keys == expected
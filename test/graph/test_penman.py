@@ -0,0 +1,66 @@
+import random
+
+import penman as pn
+
+from tuw_nlp.graph.utils import decode_penman, encode_penman, postprocess_penman
+
+ALTO_OUTPUT = "(u_1<root> / like_4  :2 (u_3 / eat_6  :2 (u_6 / sausage_7))  :1 (u_9 / dog_3  :2-of (u_12 / HAS  :1 (u_13 / Adam_1))))"  # noqa
+FOURLANG = "(k_4<root> / like  :2 (k_6 / eat  :2 (k_7 / sausage))  :1 (k_3 / dog  :2-of (u_12 / HAS  :1 (k_1 / Adam))))"  # noqa
+# reentrancies and inverted roles
+GRAPHS = [
+    "(u_1 / like :1 (u_2 / dog) :2 (u_3 / eat :1 u_2 :2 (u_4 / sausage)))",
+    "(u_1 / dog :1-of (u_2 / bark :0 u_1))",
+    "(u_1 / dog :0 (u_2 / animal :2-of (u_3 / HAS :1 u_1)) :1-of (u_4 / bark))",
+    "(u_1 / HAS :1 (u_2 / Adam :0-of (u_3 / person :1 u_1)) :2 (u_4 / dog :0 u_2))",
+    "(u_1 / dog :0 u_1 :1-of (u_2 / like :2 u_1 :1 (u_3 / cat :0-of u_2)))",
+]
+
+
+def penman_decode(string):
+    g = pn.decode(string)
+    return g.top, g.instances(), g.edges()
+
+
+def random_triples(rng):
+    variables = [f"u_{i}" for i in range(rng.randint(1, 6))]
+    triples = [(v, ":instance", rng.choice(["dog", "HAS", "eat_6"])) for v in variables]
+    for _ in range(rng.randint(0, 8)):
+        role = rng.choice([":0", ":1", ":2", ":2-of", ":UNKNOWN"])
+        triples.append((rng.choice(variables), role, rng.choice(variables)))
+    rng.shuffle(triples)
+    return triples
+
+
+def test_postprocess_penman():
+    assert postprocess_penman(ALTO_OUTPUT) == FOURLANG
+
+
+def test_decode_penman():
+    for string in (ALTO_OUTPUT, FOURLANG, "(u_1 / dog :1 u_1 :2 5)", '(u_1 / "x")'):
+        assert decode_penman(string) == penman_decode(string)
+
+
+def test_encode_penman():
+    rng = random.Random(0)
+    for _ in range(1000):
+        triples = random_triples(rng)
+        try:
+            expected = pn.encode(pn.Graph(triples), indent=0)
+        except pn.exceptions.LayoutError:
+            continue
+        assert encode_penman(triples) == expected
+        assert decode_penman(expected) == penman_decode(expected)
+
+
+def test_penman_round_trip():
+    for string in GRAPHS:
+        assert decode_penman(string) == penman_decode(string)
+        g = pn.decode(string)
+        encoded = encode_penman(g.triples)
+        assert encoded == pn.encode(pn.Graph(g.triples), indent=0)
+
+        top, instances, edges = decode_penman(encoded)
+        assert top == g.top
+        assert sorted(instances) == sorted(g.instances())
+        assert sorted(edges) == sorted(g.edges())
+        assert pn.decode(encoded).triples == g.triples
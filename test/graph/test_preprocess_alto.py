@@ -0,0 +1,24 @@
+import random
+
+from tuw_nlp.graph.utils import (
+    ALTO_NODE_REPLACEMENTS,
+    preprocess_node_alto,
+    replace_sequentially,
+)
+from tuw_nlp.text.utils import replace_emojis
+
+
+def preprocess_node_alto_sequentially(edge):
+    out = replace_emojis(replace_sequentially(edge))
+    if out[0].isdigit():
+        out = "X" + out
+    return out
+
+
+def test_preprocess_node_alto():
+    chars = "".join(a for r in ALTO_NODE_REPLACEMENTS for a in r) + "Âm2a \U0001f600"
+    rng = random.Random(0)
+    words = ["Â²", "§§", "m²", "m³", "2m²", "Straße", "★", "1/2"]
+    words += ["".join(rng.choices(chars, k=rng.randint(1, 8))) for _ in range(5000)]
+    for word in words:
+        assert preprocess_node_alto(word) == preprocess_node_alto_sequentially(word)
@@ -0,0 +1,74 @@
+import csv
+from itertools import product
+
+from tuw_nlp.common.eval import f1
+from tuw_nlp.ml.rule_learner import CURVE_FIELDS, RuleLearner, write_prefix_curve_csv
+
+EVENTS = [
+    (["a", "b"], True),
+    (["a"], False),
+    (["b", "c"], True),
+    (["c"], False),
+    (["d"], True),
+    ([], False),
+    (["a", "d"], True),
+    (["e"], False),
+]
+
+
+def make_learner():
+    learner = RuleLearner(None)
+    for feats, label in EVENTS:
+        learner.add_train_event(feats, label)
+    # "f" and "g" are unknown to the training data and are dropped
+    for feats, label in EVENTS + [(["f"], True), (["g"], False)]:
+        learner.add_valid_event(feats, label)
+    return learner
+
+
+def brute_force_count(rules, events):
+    stats = {"TP": 0, "FP": 0, "TN": 0, "FN": 0}
+    for feats, label in events:
+        matched = bool(feats & set(rules))
+        stats[("T" if matched == label else "F") + ("P" if matched else "N")] += 1
+    return stats
+
+
+def test_count():
+    learner = make_learner()
+    n_feats = len(learner.features)
+    for events in (learner.train_events, learner.valid_events):
+        for bits in product((False, True), repeat=n_feats):
+            rules = [feat for feat, bit in enumerate(bits) if bit]
+            assert learner.count(rules, events) == brute_force_count(rules, events)
+
+    # the index is rebuilt when the events change
+    learner.valid_events.append(({learner.features.get_id("a")}, True))
+    rules = [learner.features.get_id("a")]
+    expected = brute_force_count(rules, learner.valid_events)
+    assert learner.count(rules, learner.valid_events) == expected
+    assert expected["TP"] == 3
+
+
+def test_prefix_curve(tmp_path):
+    learner = make_learner()
+    rules = learner.dumb_choice()
+    ns = [3, 0, 1, len(rules), 10]
+    curve = learner.eval_prefix_curve(rules, ns)
+
+    assert [row["n"] for row in curve] == sorted(ns)
+    for row in curve:
+        stats = brute_force_count(rules[: row["n"]], learner.valid_events)
+        assert {key: row[key] for key in stats} == stats
+        pred, gold = stats["TP"] + stats["FP"], stats["TP"] + stats["FN"]
+        p = stats["TP"] / pred if pred else 1.0
+        r = stats["TP"] / gold
+        assert (row["P"], row["R"], row["F"]) == (p, r, f1(p, r))
+
+    fn = tmp_path / "curve.csv"
+    write_prefix_curve_csv(curve, fn)
+    with open(fn) as f:
+        rows = list(csv.DictReader(f))
+    assert tuple(rows[0].keys()) == CURVE_FIELDS
+    assert [int(row["TP"]) for row in rows] == [row["TP"] for row in curve]
+    assert [float(row["F"]) for row in rows] == [row["F"] for row in curve]
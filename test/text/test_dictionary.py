@@ -0,0 +1,107 @@
+import os
+import random
+import re
+from types import SimpleNamespace
+
+from tuw_nlp.text import dictionary
+from tuw_nlp.text.dictionary import (
+    DEFINITION_PREFIXES,
+    Dictionary,
+    parse_definition,
+    parse_definitions_bulk,
+    parse_line,
+)
+
+
+def parse_definition_with_regexes(defi):
+    defi = re.sub(re.escape("#"), " ", defi).strip()
+    for prefix in DEFINITION_PREFIXES:
+        defi = re.sub(f"^{re.escape(prefix)}", "", defi)
+    defi_words = defi.split(" ")
+    first_words = defi_words[0].split(",")
+    if len(first_words) > 1 and re.sub("'s", "", first_words[0].lower()) == re.sub(
+        "'s", "", first_words[1].lower()
+    ):
+        defi = " ".join([first_words[1]] + defi_words[1:])
+    return defi
+
+
+def gen_definitions(n):
+    rng = random.Random(0)
+    parts = list(DEFINITION_PREFIXES) + ["#", " ", "dog", "Dog's,dog", ",", "x"]
+    for _ in range(n):
+        yield "".join(rng.choices(parts, k=rng.randint(1, 6)))
+
+
+def test_parse_definition():
+    for defi in gen_definitions(5000):
+        assert parse_definition(defi) == parse_definition_with_regexes(defi)
+
+
+def test_parse_definitions_bulk():
+    lines = [f"word{i}\tx\t{defi}\n" for i, defi in enumerate(gen_definitions(500))]
+    expected = [parse_line(line) for line in lines]
+    assert list(parse_definitions_bulk(lines)) == expected
+    assert list(parse_definitions_bulk(lines, n_jobs=2, chunksize=64)) == expected
+
+
+DEFINITIONS = [
+    "dog\tn\tdomesticated animal that barks\n",
+    "dog\tn\tA type of domesticated animal that barks\n",
+    "dog\tv\tto follow closely; to pursue\n",
+    "cat\tn\tsmall furry animal\n",
+    "cat\tn\tshort\n",
+    "bark\tn\tbark\n",
+]
+
+
+def make_dictionary(tmp_path, monkeypatch):
+    fn = str(tmp_path / "en")
+    monkeypatch.setattr(dictionary, "get_definitions_fn", lambda lang: fn)
+    monkeypatch.setattr(
+        dictionary, "nltk_stopwords", SimpleNamespace(words=lambda lang: ["the"])
+    )
+    return Dictionary("en")
+
+
+def test_dictionary_index(tmp_path, monkeypatch):
+    with open(tmp_path / "en", "w", encoding="utf8") as f:
+        f.writelines(DEFINITIONS)
+    lexicon = make_dictionary(tmp_path, monkeypatch)
+    assert not os.path.exists(lexicon.index_fn)
+
+    assert lexicon.get_definition("dog") == "domesticated animal that barks"
+    # duplicate definitions of a headword are kept once, but each one is
+    # added again under preprocess_node_alto(word), which is the same key here
+    assert lexicon.get_definitions("dog") == [
+        "domesticated animal that barks",
+        "domesticated animal that barks",
+        "to follow closely",
+        "to follow closely",
+        " to pursue",
+        " to pursue",
+    ]
+    assert lexicon.get_definitions("cat") == ["small furry animal"] * 2
+    # too short or the same as the headword
+    assert lexicon.get_definitions("bark") == []
+    assert lexicon.get_definition("fish") is None
+    assert dict(lexicon.items()) == {
+        "dog": "domesticated animal that barks",
+        "cat": "small furry animal",
+    }
+    assert lexicon.stopwords == {"the"}
+
+    # an index that is newer than the definitions is reused
+    mtime = os.path.getmtime(lexicon.index_fn)
+    assert make_dictionary(tmp_path, monkeypatch).get_definition("fish") is None
+    assert os.path.getmtime(lexicon.index_fn) == mtime
+
+    with open(tmp_path / "en", "a", encoding="utf8") as f:
+        f.write("fish\tn\tanimal living in water\n")
+    # make the definitions newer than the index
+    os.utime(lexicon.index_fn, (mtime - 10, mtime - 10))
+    lexicon = make_dictionary(tmp_path, monkeypatch)
+    assert not lexicon.index_is_current()
+    assert lexicon.get_definition("fish") == "animal living in water"
+    assert lexicon.index_is_current()
+    assert len(lexicon.get_index()) == 3
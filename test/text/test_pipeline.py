@@ -0,0 +1,153 @@
+from types import SimpleNamespace
+
+from stanza.models.common.doc import Document as StanzaDocument
+
+from tuw_nlp.text import pipeline
+from tuw_nlp.text.pipeline import (
+    CachedStanzaPipeline,
+    CustomStanzaPipeline,
+    get_lazy_pipeline,
+    get_pipeline,
+)
+from tuw_nlp.text.utils import is_sqlite_file, save_parsed
+
+
+def make_doc(text):
+    words = [
+        {"id": i, "text": word, "lemma": word.lower()}
+        for i, word in enumerate(text.split(), start=1)
+    ]
+    return StanzaDocument([words], text=text)
+
+
+class StubPipeline:
+    """splits texts on whitespace and records what it was asked to parse"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append([text])
+        return make_doc(text)
+
+    def process_batch(self, texts):
+        self.calls.append(list(texts))
+        return [make_doc(text) for text in texts]
+
+
+def get_lemmas(doc):
+    return [word.lemma for sen in doc.sentences for word in sen.words]
+
+
+def test_cached_pipeline(tmp_path):
+    cache_fn = str(tmp_path / "nlp_cache")
+    nlp = StubPipeline()
+    with CachedStanzaPipeline(nlp, cache_fn) as cached:
+        assert get_lemmas(cached("A dog")) == ["a", "dog"]
+        assert get_lemmas(cached("A dog")) == ["a", "dog"]
+        assert nlp.calls == [["A dog"]]
+    assert is_sqlite_file(cache_fn)
+
+    # the cache is persistent
+    nlp = StubPipeline()
+    with CachedStanzaPipeline(nlp, cache_fn) as cached:
+        doc = cached("A dog")
+        assert doc.text == "A dog"
+        assert get_lemmas(doc) == ["a", "dog"]
+    assert nlp.calls == []
+
+
+def test_cached_pipeline_pipe(tmp_path):
+    nlp = StubPipeline()
+    with CachedStanzaPipeline(nlp, str(tmp_path / "nlp_cache")) as cached:
+        cached("The cat")
+        texts = ["A dog", "The cat", "A dog", "Two birds", "The cat"]
+        docs = list(cached.pipe(texts, batch_size=4))
+        assert [doc.text for doc in docs] == texts
+        assert [get_lemmas(doc) for doc in docs] == [t.lower().split() for t in texts]
+        # only texts missing from the cache are parsed, each once per batch
+        assert nlp.calls == [["The cat"], ["A dog", "Two birds"]]
+
+
+def test_cached_pipeline_legacy_json(tmp_path):
+    json_fn = str(tmp_path / "nlp_cache.json")
+    save_parsed({"A dog": make_doc("A dog")}, json_fn)
+
+    nlp = StubPipeline()
+    with CachedStanzaPipeline(nlp, json_fn) as cached:
+        assert cached.cache_path == f"{json_fn}.db"
+        assert get_lemmas(cached("A dog")) == ["a", "dog"]
+    assert nlp.calls == []
+    assert is_sqlite_file(f"{json_fn}.db")
+    assert not is_sqlite_file(json_fn)
+
+    # a new cache with a JSON name is also kept in <name>.db
+    new_fn = str(tmp_path / "new_cache.json")
+    with CachedStanzaPipeline(nlp, new_fn) as cached:
+        assert cached.cache_path == f"{new_fn}.db"
+
+
+class StubTokenizer:
+    """splits documents into sentences at periods"""
+
+    def __call__(self, docs):
+        return [
+            SimpleNamespace(
+                sentences=[SimpleNamespace(text=sen) for sen in doc.text.split(".")]
+            )
+            for doc in docs
+        ]
+
+
+def test_custom_pipeline_batch():
+    nlp = CustomStanzaPipeline.__new__(CustomStanzaPipeline)
+    nlp.tokenizer = StubTokenizer()
+    parsed = []
+
+    def additional(docs):
+        parsed.append([doc.text for doc in docs])
+        return [make_doc(doc.text) for doc in docs]
+
+    nlp.additional = additional
+    texts = ["A dog.The cat", "Birds", "Fish.Frogs.Ants"]
+    assert nlp.ssplit_batch(texts) == [
+        ["A dog", "The cat"],
+        ["Birds"],
+        ["Fish", "Frogs", "Ants"],
+    ]
+    docs = list(nlp.pipe(texts, batch_size=2))
+    assert [doc.text for doc in docs] == [
+        "A dog\n\nThe cat",
+        "Birds",
+        "Fish\n\nFrogs\n\nAnts",
+    ]
+    assert parsed == [["A dog\n\nThe cat", "Birds"], ["Fish\n\nFrogs\n\nAnts"]]
+    assert nlp.process_batch([]) == []
+
+
+def test_pipeline_registry(tmp_path, monkeypatch):
+    built = []
+
+    class StubCustomPipeline(StubPipeline):
+        def __init__(self, lang, processors, package):
+            super().__init__()
+            built.append((lang, processors, package))
+
+    monkeypatch.setattr(pipeline, "CustomStanzaPipeline", StubCustomPipeline)
+    monkeypatch.setattr(pipeline, "_pipelines", {})
+
+    nlp = get_pipeline("en", "tokenize,pos")
+    assert get_pipeline("en", "tokenize,pos") is nlp
+    assert get_pipeline("en", "tokenize") is not nlp
+    assert built == [("en", "tokenize,pos", "default"), ("en", "tokenize", "default")]
+
+    # lazy pipelines are only built when a text has to be parsed
+    init = get_lazy_pipeline("de", "tokenize")
+    cached = CachedStanzaPipeline(None, str(tmp_path / "nlp_cache"), init=init)
+    other = CachedStanzaPipeline(None, str(tmp_path / "other_cache"), init=init)
+    assert len(built) == 2
+    assert get_lemmas(cached("A dog")) == ["a", "dog"]
+    assert built[2:] == [("de", "tokenize", "default")]
+    assert get_lemmas(other("A cat")) == ["a", "cat"]
+    assert other.nlp is cached.nlp
+    assert len(built) == 3
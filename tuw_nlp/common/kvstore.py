@@ -0,0 +1,87 @@
+import os
+import sqlite3
+
+
+class KVStore:
+    """Persistent key-value store backed by a single SQLite file.
+
+    Every write is committed on its own, so several processes can use the
+    same file at once: in write-ahead-log mode readers are never blocked and
+    writers wait for each other for up to timeout seconds. The connection is
+    opened lazily and reopened after a fork, so instances can be passed to
+    worker processes.
+    """
+
+    def __init__(self, fn, table="store", timeout=60):
+        self.fn = fn
+        self.table = table
+        self.timeout = timeout
+        self.conn = None
+        self.pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["conn"] = None
+        state["pid"] = None
+        return state
+
+    def connect(self):
+        if self.conn is None or self.pid != os.getpid():
+            self.conn = sqlite3.connect(
+                self.fn, timeout=self.timeout, isolation_level=None
+            )
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value BLOB)"
+            )
+            self.pid = os.getpid()
+        return self.conn
+
+    def close(self):
+        if self.conn is not None and self.pid == os.getpid():
+            self.conn.close()
+        self.conn = None
+        self.pid = None
+
+    def get(self, key, default=None):
+        row = (
+            self.connect()
+            .execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,))
+            .fetchone()
+        )
+        return default if row is None else row[0]
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return (
+            self.connect().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        )
+
+    def put(self, key, value):
+        self.connect().execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)",
+            (key, value),
+        )
+
+    def update(self, items):
+        """write an iterable of (key, value) pairs in a single transaction"""
+        conn = self.connect()
+        with conn:
+            # take the write lock right away, a deferred transaction that
+            # has to upgrade its lock fails without waiting for timeout
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)",
+                items,
+            )
+
+    def keys(self):
+        for (key,) in self.connect().execute(f"SELECT key FROM {self.table}"):
+            yield key
+
+    def items(self):
+        yield from self.connect().execute(f"SELECT key, value FROM {self.table}")
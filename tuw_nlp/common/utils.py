@@ -1,4 +1,5 @@
 import os
+from itertools import islice
 
 from stanza.utils.conll import CoNLL
 
@@ -48,3 +49,13 @@ def print_conll(sen, out):
 def ensure_dir(path):
     if not os.path.exists(path):
         os.makedirs(path)
+
+
+def chunks(iterable, size):
+    """yield lists of at most size consecutive elements of iterable"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
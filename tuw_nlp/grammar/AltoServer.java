@@ -0,0 +1,77 @@
+import de.up.ling.irtg.script.ParsingEvaluator;
+
+import java.io.BufferedReader;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+
+/**
+ * Runs ALTO's ParsingEvaluator repeatedly in a single JVM. Each line read from
+ * stdin holds the tab-separated command line arguments of one ParsingEvaluator
+ * run. After each run a single line is written to stdout: "OK" on success,
+ * "ERROR <message>" otherwise. Anything ALTO itself prints goes to stderr.
+ *
+ * Calls to System.exit from ParsingEvaluator are turned into exceptions where
+ * the JVM still allows installing a security manager (Java 17 and earlier),
+ * exit status 0 counting as success. On newer JVMs such a call ends the
+ * server, and the Python side restarts it.
+ */
+public class AltoServer {
+    static class ExitException extends SecurityException {
+        final int status;
+
+        ExitException(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    static class NoExitSecurityManager extends SecurityManager {
+        @Override
+        public void checkPermission(Permission perm) {
+        }
+
+        @Override
+        public void checkPermission(Permission perm, Object context) {
+        }
+
+        @Override
+        public void checkExit(int status) {
+            throw new ExitException(status);
+        }
+    }
+
+    @SuppressWarnings("removal")
+    static void preventExit() {
+        try {
+            System.setSecurityManager(new NoExitSecurityManager());
+        } catch (UnsupportedOperationException e) {
+            System.err.println("AltoServer: cannot intercept System.exit on this JVM");
+        }
+    }
+
+    public static void main(String[] args) throws Exception {
+        PrintStream protocol = new PrintStream(System.out, true, "UTF-8");
+        System.setOut(System.err);
+        preventExit();
+
+        BufferedReader in = new BufferedReader(
+                new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.isEmpty()) {
+                continue;
+            }
+            try {
+                ParsingEvaluator.main(line.split("\t"));
+                protocol.println("OK");
+            } catch (ExitException e) {
+                protocol.println(e.status == 0 ? "OK" : "ERROR " + e.getMessage());
+            } catch (Throwable e) {
+                e.printStackTrace();
+                protocol.println("ERROR " + e.toString().replace('\n', ' '));
+            }
+        }
+    }
+}
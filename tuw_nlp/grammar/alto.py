@@ -1,5 +1,9 @@
 import os
+import queue
+import shutil
 import subprocess
+import threading
+from functools import lru_cache
 
 from tuw_nlp import logger
 
@@ -14,6 +18,27 @@ assert (
     ALTO_JAR
 ), "ALTO is not downloaded, for setup please use tuw_nlp.download_alto(), or download ALTO manually and set the ALTO_JAR enviroment variable to the correct path"
 
+# single-file java program, launched directly by java (requires Java 11+)
+ALTO_SERVER_SRC = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "AltoServer.java"
+)
+
+
+def get_evaluator_args(
+    input_fn, grammar_fn, output_fn, input_int, output_int, output_codec
+):
+    return [
+        input_fn,
+        "-g",
+        grammar_fn,
+        "-I",
+        input_int,
+        "-O",
+        f"{output_int}={output_codec}",
+        "-o",
+        output_fn,
+    ]
+
 
 def get_alto_command(
     input_fn,
@@ -25,64 +50,33 @@ def get_alto_command(
     timeout=60,
     memory="32G",
 ):
-    if os.name == "nt":  # timeout not available on windows
-        return [
-            "java",
-            f"-Xmx{memory}",
-            "-cp",
-            ALTO_JAR,
-            "de.up.ling.irtg.script.ParsingEvaluator",
-            input_fn,
-            "-g",
-            grammar_fn,
-            "-I",
-            input_int,
-            "-O",
-            f"{output_int}={output_codec}",
-            "-o",
-            output_fn,
-        ]
-    elif os.name == "posix":
-        return [
-            "java",
-            f"-Xmx{memory}",
-            "-cp",
-            ALTO_JAR,
-            "de.up.ling.irtg.script.ParsingEvaluator",
-            input_fn,
-            "-g",
-            grammar_fn,
-            "-I",
-            input_int,
-            "-O",
-            f"{output_int}={output_codec}",
-            "-o",
-            output_fn,
-        ]
-    else:
-        return [
-            "timeout",
-            str(timeout),
-            "java",
-            f"-Xmx{memory}",
-            "-cp",
-            ALTO_JAR,
-            "de.up.ling.irtg.script.ParsingEvaluator",
-            input_fn,
-            "-g",
-            grammar_fn,
-            "-I",
-            input_int,
-            "-O",
-            f"{output_int}={output_codec}",
-            "-o",
-            output_fn,
-        ]
+    command = [
+        "java",
+        f"-Xmx{memory}",
+        "-cp",
+        ALTO_JAR,
+        "de.up.ling.irtg.script.ParsingEvaluator",
+    ] + get_evaluator_args(
+        input_fn, grammar_fn, output_fn, input_int, output_int, output_codec
+    )
+    if os.name == "nt" or shutil.which("timeout") is None:
+        # the timeout command is not available on windows
+        return command
+    return ["timeout", str(timeout)] + command
+
+
+def get_alto_server_command(memory="32G"):
+    return ["java", f"-Xmx{memory}", "-cp", ALTO_JAR, ALTO_SERVER_SRC]
 
 
 def get_rule_string(irtg_rule, interpretations):
+    return format_rule(irtg_rule, tuple(interpretations.items()))
+
+
+@lru_cache(maxsize=65536)
+def format_rule(irtg_rule, interpretation_items):
     lines = [irtg_rule] + [
-        f"[{int_name}] {int_rule}" for int_name, int_rule in interpretations.items()
+        f"[{int_name}] {int_rule}" for int_name, int_rule in interpretation_items
     ]
     return "\n".join(lines)
 
@@ -104,8 +98,8 @@ def run_alto(
         input_int,
         output_int,
         output_codec,
-        timeout=60,
-        memory="32G",
+        timeout=timeout,
+        memory=memory,
     )
     logger.info("running alto: {}".format(" ".join(command)))
     cproc = subprocess.run(command)
@@ -117,3 +111,124 @@ def run_alto(
         return False
 
     return True
+
+
+class AltoWorker:
+    """Long-lived ALTO process that runs ParsingEvaluator for each request,
+    saving the JVM startup on every sentence. Requests are tab-separated
+    ParsingEvaluator arguments sent over stdin, each answered by a single
+    line on stdout. The worker is restarted if it crashes, and killed if a
+    request takes longer than timeout seconds. To bound any state that
+    ParsingEvaluator leaves behind between runs, a fresh JVM is started after
+    every max_requests requests."""
+
+    def __init__(self, timeout=60, memory="32G", max_requests=1000):
+        self.timeout = timeout
+        self.memory = memory
+        self.max_requests = max_requests
+        self.n_requests = 0
+        self.proc = None
+        self.responses = None
+
+    def start(self):
+        command = get_alto_server_command(memory=self.memory)
+        logger.info("starting alto worker: {}".format(" ".join(command)))
+        self.proc = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        self.responses = queue.Queue()
+        reader = threading.Thread(
+            target=self._read_responses,
+            args=(self.proc.stdout, self.responses),
+            daemon=True,
+        )
+        reader.start()
+        self.n_requests = 0
+
+    @staticmethod
+    def _read_responses(stream, responses):
+        for line in stream:
+            responses.put(line.strip())
+        responses.put(None)
+
+    def is_alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def stop(self):
+        if self.proc is None:
+            return
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        self.proc = None
+
+    def run(
+        self,
+        input_fn,
+        grammar_fn,
+        output_fn,
+        input_int,
+        output_int,
+        output_codec,
+        timeout=None,
+    ):
+        if self.is_alive() and self.n_requests >= self.max_requests:
+            logger.info("restarting alto worker")
+            self.stop()
+        if not self.is_alive():
+            if self.proc is not None:
+                logger.warning("alto worker died, restarting")
+                self.stop()
+            self.start()
+        self.n_requests += 1
+
+        args = get_evaluator_args(
+            input_fn, grammar_fn, output_fn, input_int, output_int, output_codec
+        )
+        logger.info("sending to alto worker: {}".format(" ".join(args)))
+        had_output = os.path.exists(output_fn)
+        try:
+            self.proc.stdin.write("\t".join(args) + "\n")
+            self.proc.stdin.flush()
+            response = self.responses.get(timeout=timeout or self.timeout)
+        except (BrokenPipeError, OSError):
+            logger.warning("alto worker crashed")
+            self.stop()
+            return False
+        except queue.Empty:
+            logger.warning("alto timeout")
+            self.stop()
+            return False
+
+        if response is None:
+            # the JVM can exit normally before answering, e.g. if
+            # ParsingEvaluator calls System.exit(0) on a JVM where it cannot
+            # be intercepted, the output is complete in that case
+            try:
+                returncode = self.proc.wait(timeout=timeout or self.timeout)
+            except subprocess.TimeoutExpired:
+                returncode = None
+            self.stop()
+            if returncode == 0 and not had_output and os.path.isfile(output_fn):
+                logger.info("alto worker exited after writing its output")
+                return True
+            logger.warning("alto worker crashed")
+            return False
+        elif response != "OK":
+            logger.warning(f"alto error: {response}")
+            return False
+        elif not os.path.isfile(output_fn):
+            logger.warning(f"alto did not write {output_fn}")
+            return False
+
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.stop()
@@ -0,0 +1,66 @@
+import argparse
+import logging
+
+from tqdm import tqdm
+
+from tuw_nlp import logger
+from tuw_nlp.common.utils import chunks
+from tuw_nlp.grammar.text_to_4lang import TextTo4lang
+from tuw_nlp.graph.definition_graph import DefinitionGraph
+
+
+def gen_definition_fls(tfl, batch_size=32):
+    items = list(tfl.lexicon.items())
+    with tqdm(total=len(items)) as progress:
+        for batch in chunks(items, 1000 * batch_size):
+            fls = tfl.parse_definitions(batch, batch_size)
+            for word, definition in batch:
+                fl = fls[word, definition]
+                if fl is None:
+                    logger.warning(
+                        f"could not parse definition of {word}: {definition}"
+                    )
+                    continue
+                yield word, fl
+            progress.update(len(batch))
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="parse the definitions of all dictionary headwords into a "
+        + "single definition graph that TextTo4lang can use for expansion"
+    )
+    parser.add_argument("-cd", "--cache-dir", default=None, type=str)
+    parser.add_argument("-cn", "--nlp-cache", required=True, type=str)
+    parser.add_argument("-l", "--lang", default=None, type=str)
+    parser.add_argument("-pa", "--persistent-alto", action="store_true")
+    parser.add_argument("-b", "--batch-size", default=32, type=int)
+    parser.add_argument("-dc", "--definition-cache", default=None, type=str)
+    parser.add_argument("-o", "--output", required=True, type=str)
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(
+        format="%(asctime)s : "
+        + "%(module)s (%(lineno)s) - %(levelname)s - %(message)s"
+    )
+    logging.getLogger().setLevel(logging.INFO)
+    args = get_args()
+    with TextTo4lang(
+        args.lang,
+        args.nlp_cache,
+        args.cache_dir,
+        args.persistent_alto,
+        args.definition_cache,
+    ) as tfl:
+        definition_graph = DefinitionGraph.from_penman(
+            gen_definition_fls(tfl, args.batch_size)
+        )
+
+    definition_graph.save(args.output)
+    logger.info(f"saved definitions of {len(definition_graph)} words to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
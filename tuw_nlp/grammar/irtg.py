@@ -2,16 +2,45 @@ import datetime
 import json
 import os
 import random
+import re
 from collections import defaultdict
+from functools import lru_cache
+from itertools import chain
 
 from dict_recursive_update import recursive_update
 
 from tuw_nlp import logger
+from tuw_nlp.common.kvstore import KVStore
 from tuw_nlp.common.utils import ensure_dir
-from tuw_nlp.grammar.alto import get_rule_string, run_alto
+from tuw_nlp.grammar.alto import AltoWorker, get_rule_string, run_alto
 from tuw_nlp.grammar.utils import get_dummy_input
 from tuw_nlp.graph.utils import postprocess_penman
 
+TREE_ALGEBRA = "de.up.ling.irtg.algebra.TreeWithAritiesAlgebra"
+
+IRTG_RULE_PATT = re.compile(r"^(\S+) -> ([^\s(]+)(?:\(([^)]*)\))?(\s*\[.*\])?$")
+
+
+@lru_cache(maxsize=65536)
+def namespace_rule(irtg_rule, prefix):
+    """Add prefix to all nonterminals and to the label of an IRTG rule, so that
+    rules generated for different inputs can be put in the same grammar.
+    The start nonterminal becomes an ordinary one.
+
+    Example: 'NOUN -> NOUN_AMOD_ADJ_0(AMOD_ADJ, NOUN) [0.1]' with prefix 's3_'
+    becomes 's3_NOUN -> s3_NOUN_AMOD_ADJ_0(s3_AMOD_ADJ, s3_NOUN) [0.1]'
+    """
+    match = IRTG_RULE_PATT.match(irtg_rule)
+    if match is None:
+        raise ValueError(f"cannot parse IRTG rule: {irtg_rule}")
+    lhs, label, args, weight = match.groups()
+    rule = f"{prefix}{lhs.rstrip('!')} -> {prefix}{label}"
+    if args is not None:
+        rule += "({})".format(
+            ", ".join(prefix + arg.strip() for arg in args.split(","))
+        )
+    return rule + (weight or "")
+
 
 class IRTGCache:
     @staticmethod
@@ -61,21 +90,83 @@ class IRTGCache:
 
         self.cache[input_int][input_obj][output_int][output_codec] = output_obj
 
+    def gen_entries(self):
+        for input_int, inputs in self.cache.items():
+            for input_obj, outputs in inputs.items():
+                for output_int, codecs in outputs.items():
+                    for output_codec, output_obj in codecs.items():
+                        yield input_obj, input_int, output_int, output_codec, output_obj
+
+
+class SQLiteIRTGCache:
+    """Drop-in replacement for IRTGCache that stores each entry in an SQLite
+    file as soon as it is added, keyed by (input_int, input_obj, output_int,
+    output_codec). Adding an entry costs the same regardless of the size of
+    the cache, and several processes can share the same file."""
+
+    def __init__(self, interpretations, fn):
+        self.fn = fn
+        self.interpretations = interpretations
+        self.store = KVStore(fn, table="irtg_cache")
+
+    @staticmethod
+    def get_key(input_obj, input_int, output_int, output_codec):
+        return json.dumps([input_int, input_obj, output_int, output_codec])
+
+    def get(self, input_obj, input_int, output_int, output_codec, create_path=False):
+        key = self.get_key(input_obj, input_int, output_int, output_codec)
+        return self.store.get(key)
+
+    def add(self, input_obj, input_int, output_int, output_codec, output_obj):
+        key = self.get_key(input_obj, input_int, output_int, output_codec)
+        self.store.put(key, output_obj)
+
+    def update(self, entries):
+        """add an iterable of (input_obj, input_int, output_int, output_codec,
+        output_obj) tuples, e.g. from IRTGCache.gen_entries"""
+        self.store.update((self.get_key(*entry[:4]), entry[4]) for entry in entries)
+
+    def gen_entries(self):
+        for key, output_obj in self.store.items():
+            input_int, input_obj, output_int, output_codec = json.loads(key)
+            yield input_obj, input_int, output_int, output_codec, output_obj
+
+    def update_file(self, fn):
+        # entries are written to disk by add
+        pass
+
 
 class IRTGGrammar:
     def __init__(self, **kwargs):
         self.tmpdir = os.getenv("TUWNLP_TMPDIR", "tmp")
         ensure_dir(self.tmpdir)
         self.load_cache(**kwargs)
+        if kwargs.get("persistent_alto"):
+            self.alto_worker = AltoWorker()
+        else:
+            self.alto_worker = None
 
     def load_cache(self, **kwargs):
         cache_path = kwargs.get("cache_dir") or "cache"
-        cache_fn = kwargs.get("cache_fn") or f"{self.__class__.__name__}.json"
+        cache_backend = kwargs.get("cache_backend") or "sqlite"
+        if cache_backend not in ("json", "sqlite"):
+            raise ValueError(f"unknown cache backend: {cache_backend}")
+        ext = "json" if cache_backend == "json" else "db"
+        cache_fn = kwargs.get("cache_fn") or f"{self.__class__.__name__}.{ext}"
         ensure_dir(cache_path)
         fn = os.path.join(cache_path, cache_fn)
-        if not os.path.exists(fn):
+        interpretations = sorted(self.interpretations.keys())
+        if cache_backend == "sqlite":
+            json_fn = os.path.join(cache_path, f"{self.__class__.__name__}.json")
+            is_new = not os.path.exists(fn)
+            logger.info(f"using cache file: {fn}")
+            self.cache = SQLiteIRTGCache(interpretations, fn)
+            if is_new and os.path.exists(json_fn):
+                logger.info(f"importing old cache from {json_fn}")
+                self.cache.update(IRTGCache.load(json_fn).gen_entries())
+        elif not os.path.exists(fn):
             logger.info(f"setting up new cache file: {fn}")
-            self.cache = IRTGCache(sorted(self.interpretations.keys()), fn, new=True)
+            self.cache = IRTGCache(interpretations, fn, new=True)
         else:
             logger.info(f"loading cache from file: {fn}")
             self.cache = IRTGCache.load(fn)
@@ -91,11 +182,13 @@ class IRTGGrammar:
         output = self.run(input_obj, input_int, output_int, output_codec)
         return self.postprocess_output(output, **kwargs)
 
+    def check_interpretations(self, *interpretations):
+        for interpretation in interpretations:
+            if interpretation not in self.interpretations:
+                raise ValueError(f"unknown interpretation: {interpretation}")
+
     def parse(self, orig_input, input_int, output_int, output_codec, **kwargs):
-        if input_int not in self.interpretations:
-            raise ValueError(f"unknown interpretation: {input_int}")
-        if output_int not in self.interpretations:
-            raise ValueError(f"unknown interpretation: {output_int}")
+        self.check_interpretations(input_int, output_int)
 
         input_obj = self.preprocess_input(orig_input, **kwargs)
 
@@ -110,6 +203,49 @@ class IRTGGrammar:
             return output_obj
         return cached
 
+    def parse_batch(
+        self, orig_inputs, input_int, output_int, output_codec, batch_size=100, **kwargs
+    ):
+        """Parse a list of inputs, running ALTO only once for every batch_size
+        uncached inputs. Outputs are returned in the order of the inputs,
+        None for inputs that could not be parsed."""
+        self.check_interpretations(input_int, output_int)
+
+        outputs = [None] * len(orig_inputs)
+        uncached = {}
+        for i, orig_input in enumerate(orig_inputs):
+            input_obj = self.preprocess_input(orig_input, **kwargs)
+            cached = self.cache.get(input_obj, input_int, output_int, output_codec)
+            if cached is not None:
+                outputs[i] = cached
+            elif input_obj in uncached:
+                uncached[input_obj][0].append(i)
+            else:
+                # rules must be generated while input_obj is the current input
+                uncached[input_obj] = ([i], list(self.gen_rules()))
+
+        todo = list(uncached.items())
+        for start in range(0, len(todo), batch_size):
+            batch = todo[start : start + batch_size]
+            batch_outputs = self.run_batch(
+                [(input_obj, rules) for input_obj, (_, rules) in batch],
+                input_int,
+                output_int,
+                output_codec,
+            )
+            for (input_obj, (positions, _)), output in zip(batch, batch_outputs):
+                if output is None:
+                    continue
+                output_obj = self.postprocess_output(output, **kwargs)
+                self.cache.add(
+                    input_obj, input_int, output_int, output_codec, output_obj
+                )
+                for i in positions:
+                    outputs[i] = output_obj
+            self.cache.update_file(self.cache_fn)
+
+        return outputs
+
     def gen_file_names(self):
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         rand_id = random.randrange(100000, 999999)
@@ -138,17 +274,19 @@ class IRTGGrammar:
             f.write(f"{transformed_input}\n")
             f.write(f"{dummy_input}\n")
 
-    def write_grammar_file(self, grammar_fn):
+    def write_grammar_file(self, grammar_fn, rules=None):
+        self.write_rule_strings(grammar_fn, self.gen_rule_strings(rules))
+
+    def write_rule_strings(self, grammar_fn, rule_strings):
+        lines = chain(self.gen_grammar_header(), [""], rule_strings, [""])
         with open(grammar_fn, "w") as f:
-            for line in self.gen_grammar_header():
-                f.write(f"{line}\n")
-            f.write("\n")
-            for rule_string in self.gen_rule_strings():
-                f.write(f"{rule_string}\n")
+            f.write("\n".join(lines))
 
-    def gen_rule_strings(self):
+    def gen_rule_strings(self, rules=None):
+        if rules is None:
+            rules = self.gen_rules()
         term_rule_strings = []
-        for irtg_rule, interpretations, rule_type in self.gen_rules():
+        for irtg_rule, interpretations, rule_type in rules:
             rule_string = get_rule_string(irtg_rule, interpretations)
             if rule_type == "terminal":
                 term_rule_strings.append(rule_string)
@@ -156,17 +294,89 @@ class IRTGGrammar:
             yield rule_string
         yield from term_rule_strings
 
-    def create_alto_files(self, transformed_input, input_int):
+    def create_alto_files(self, transformed_input, input_int, rules=None):
         input_fn, grammar_fn, output_fn = self.gen_file_names()
         self.write_input_file(transformed_input, input_fn, input_int)
-        self.write_grammar_file(grammar_fn)
+        self.write_grammar_file(grammar_fn, rules)
         return input_fn, grammar_fn, output_fn
 
-    def run(self, transformed_input, input_int, output_int, output_codec):
+    def gen_batch_rules(self, n, rules, input_int):
+        """Rules of the n-th input of a batch. Each input is wrapped in a tree
+        with the unique root label batch<n>, which only the n-th start rule
+        accepts, so each input can only be derived by its own rules."""
+        prefix = f"s{n}_"
+        start = [rule for rule, _, _ in rules if rule.split(" -> ")[0].endswith("!")]
+        if len(start) != 1:
+            raise ValueError(f"there must be exactly one start rule, got {start}")
+        start_nt = start[0].split(" -> ")[0].rstrip("!")
+        yield (
+            f"S! -> batch{n}({prefix}{start_nt})",
+            {
+                name: f"batch{n}_1(?1)" if name == input_int else "?1"
+                for name in self.interpretations
+            },
+            "start",
+        )
+        for irtg_rule, interpretations, rule_type in rules:
+            yield namespace_rule(irtg_rule, prefix), interpretations, rule_type
+
+    def write_batch_input_file(self, transformed_inputs, input_fn, input_int):
+        input_alg = self.interpretations[input_int]
+        dummy_input = get_dummy_input(input_alg)
+        with open(input_fn, "w") as f:
+            for line in self.gen_input_header(input_int):
+                f.write(f"{line}\n")
+            f.write("\n")
+            for n, transformed_input in enumerate(transformed_inputs):
+                f.write(f"batch{n}({transformed_input})\n")
+            f.write(f"{dummy_input}\n")
+
+    def write_batch_grammar_file(self, rule_lists, grammar_fn, input_int):
+        rule_strings = chain.from_iterable(
+            self.gen_rule_strings(self.gen_batch_rules(n, rules, input_int))
+            for n, rules in enumerate(rule_lists)
+        )
+        self.write_rule_strings(grammar_fn, rule_strings)
+
+    def run_batch(self, inputs, input_int, output_int, output_codec):
+        """inputs is a list of (transformed_input, rules) pairs. If ALTO fails
+        on the whole batch, each input is parsed on its own, so that only
+        the inputs that fail by themselves get None."""
+        if self.interpretations[input_int] != TREE_ALGEBRA:
+            # inputs of a batch can only be told apart if they are trees
+            return [
+                self.run(transformed_input, input_int, output_int, output_codec, rules)
+                for transformed_input, rules in inputs
+            ]
+        input_fn, grammar_fn, output_fn = self.gen_file_names()
+        self.write_batch_input_file(
+            [transformed_input for transformed_input, _ in inputs], input_fn, input_int
+        )
+        self.write_batch_grammar_file(
+            [rules for _, rules in inputs], grammar_fn, input_int
+        )
+        success = self.run_alto(
+            input_fn, grammar_fn, output_fn, input_int, output_int, output_codec
+        )
+        if not success and len(inputs) == 1:
+            return [None]
+        elif not success:
+            logger.warning(
+                f"alto failed on a batch of {len(inputs)}, parsing one by one"
+            )
+            return [
+                self.run(transformed_input, input_int, output_int, output_codec, rules)
+                for transformed_input, rules in inputs
+            ]
+        outputs, _ = self.parse_output(output_fn)
+        outputs += [None] * (len(inputs) - len(outputs))
+        return outputs[: len(inputs)]
+
+    def run(self, transformed_input, input_int, output_int, output_codec, rules=None):
         input_fn, grammar_fn, output_fn = self.create_alto_files(
-            transformed_input, input_int
+            transformed_input, input_int, rules
         )
-        success = run_alto(
+        success = self.run_alto(
             input_fn, grammar_fn, output_fn, input_int, output_int, output_codec
         )
         if success:
@@ -174,6 +384,17 @@ class IRTGGrammar:
             return outputs[0]
         return None
 
+    def run_alto(self, *args):
+        # batches get the same timeout as single inputs, inputs of a batch
+        # that times out are retried one by one
+        if self.alto_worker is not None:
+            return self.alto_worker.run(*args)
+        return run_alto(*args)
+
+    def close(self):
+        if self.alto_worker is not None:
+            self.alto_worker.stop()
+
     def parse_output(self, output_fn):
         derivs, outputs = [], []
         with open(output_fn) as f:
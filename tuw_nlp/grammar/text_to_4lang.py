@@ -2,82 +2,276 @@ import argparse
 import logging
 import sys
 import traceback
+from collections import OrderedDict
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
 
-import stanza
+import torch
 from tqdm import tqdm
 
+from tuw_nlp import logger
+from tuw_nlp.common.kvstore import KVStore
+from tuw_nlp.common.utils import chunks
 from tuw_nlp.grammar.ud_fl import UD_FL
+from tuw_nlp.graph.definition_graph import DefinitionGraph
 from tuw_nlp.graph.fourlang import FourLang
 from tuw_nlp.graph.lexical import LexGraphs
-from tuw_nlp.graph.utils import graph_to_pn, pn_to_graph
+from tuw_nlp.graph.utils import pn_to_graph
 from tuw_nlp.text.dictionary import Dictionary
-from tuw_nlp.text.pipeline import CachedStanzaPipeline, CustomStanzaPipeline
+from tuw_nlp.text.pipeline import (
+    LANG_PIPELINES,
+    CachedStanzaPipeline,
+    get_lazy_pipeline,
+)
 from tuw_nlp.text.preprocessor import Preprocessor
 
 
+class DefinitionCache:
+    """Parsed definitions (4lang graphs in penman notation), keyed by
+    (lang, word, definition). The most recently used maxsize entries are kept
+    in memory (all of them if maxsize is None), all others are looked up in
+    an optional SQLite file."""
+
+    def __init__(self, fn=None, maxsize=10000):
+        self.maxsize = maxsize
+        self.memory = OrderedDict()
+        self.store = None if fn is None else KVStore(fn, table="definition_cache")
+
+    @staticmethod
+    def get_key(lang, word, definition):
+        return "\t".join((lang, word, definition))
+
+    def remember(self, key, fl):
+        self.memory[key] = fl
+        self.memory.move_to_end(key)
+        if self.maxsize is not None and len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        fl = self.memory.get(key)
+        if fl is not None:
+            self.memory.move_to_end(key)
+            return fl
+        if self.store is not None:
+            fl = self.store.get(key)
+            if fl is not None:
+                self.remember(key, fl)
+        return fl
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def put(self, key, fl):
+        self.remember(key, fl)
+        if self.store is not None:
+            self.store.put(key, fl)
+
+    def update(self, items):
+        items = list(items)
+        for key, fl in items:
+            self.remember(key, fl)
+        if self.store is not None:
+            self.store.update(items)
+
+
 class TextTo4lang:
-    def __init__(self, lang, nlp_cache, cache_dir=None):
-        if lang == "de":
-            nlp = CustomStanzaPipeline(processors="tokenize,mwt,pos,lemma,depparse")
-        elif lang == "en":
-            nlp = CustomStanzaPipeline(
-                "en", processors="tokenize,mwt,pos,lemma,depparse"
-            )
-        elif lang == "en_bio":
-            nlp = CustomStanzaPipeline("en", package="craft")
+    def __init__(
+        self,
+        lang,
+        nlp_cache,
+        cache_dir=None,
+        persistent_alto=False,
+        definition_cache=None,
+        definition_cache_size=10000,
+        definition_graph=None,
+    ):
         assert lang, "TextTo4lang does not have lang set"
 
         self.lang = lang
 
-        self.nlp = CachedStanzaPipeline(nlp, nlp_cache)
+        self.nlp = CachedStanzaPipeline(
+            None, nlp_cache, init=get_lazy_pipeline(**LANG_PIPELINES[lang])
+        )
 
-        self.ud_fl = UD_FL(cache_dir=cache_dir, lang=lang)
+        self.ud_fl = UD_FL(
+            cache_dir=cache_dir, lang=lang, persistent_alto=persistent_alto
+        )
 
         self.lexicon = Dictionary(lang)
+        self.definition_cache = DefinitionCache(
+            definition_cache, maxsize=definition_cache_size
+        )
+        self.definition_graph = None
+        if definition_graph is not None:
+            logger.info(f"loading definition graph from {definition_graph}")
+            self.definition_graph = DefinitionGraph.load(definition_graph)
 
         self.graph_lexical = LexGraphs()
 
-    def add_definition(self, graph, node, definition, substitute, strategy):
-        sen = self.nlp(definition).sentences[0]
-        def_graph, root = self.parse(sen)
+    def parse_definition(self, word, definition):
+        """Returns the 4lang graph of a definition in penman notation,
+        parsing it only if it is not in the definition cache."""
+        key = DefinitionCache.get_key(self.lang, word, definition)
+        fl = self.definition_cache.get(key)
+        if fl is None:
+            sen = self.nlp(definition).sentences[0]
+            fl = self.ud_fl.parse(sen, "ud", "fl", "amr-sgraph-src")
+            if fl is not None:
+                self.definition_cache.put(key, fl)
+        return fl
+
+    def parse_definitions(self, words_definitions, batch_size=32):
+        """Returns the 4lang graphs of (word, definition) pairs in penman
+        notation, or None if a definition could not be parsed. Definitions
+        that are not in the definition cache are parsed together, batch_size
+        at a time."""
+        fls = {}
+        todo = []
+        for word, definition in words_definitions:
+            fls[word, definition] = self.definition_cache.get(
+                DefinitionCache.get_key(self.lang, word, definition)
+            )
+            if fls[word, definition] is None:
+                todo.append((word, definition))
+
+        for batch in chunks(todo, batch_size):
+            definitions = list(dict.fromkeys(definition for _, definition in batch))
+            docs = list(self.nlp.pipe(definitions, batch_size=batch_size))
+            try:
+                batch_fls = self.ud_fl.parse_batch(
+                    [doc.sentences[0] for doc in docs], "ud", "fl", "amr-sgraph-src"
+                )
+            except (TypeError, IndexError, KeyError, ValueError):
+                # parse definitions one by one so that errors only affect their own
+                batch_fls = [
+                    self.parse_definition_doc(definition, doc)
+                    for definition, doc in zip(definitions, docs)
+                ]
+            parsed = dict(zip(definitions, batch_fls))
+            for word, definition in batch:
+                fls[word, definition] = parsed[definition]
+            self.definition_cache.update(
+                (
+                    DefinitionCache.get_key(self.lang, word, definition),
+                    parsed[definition],
+                )
+                for word, definition in batch
+                if parsed[definition] is not None
+            )
+
+        return fls
+
+    def parse_definition_doc(self, definition, doc):
+        """Returns the 4lang graph of the first sentence of a parsed
+        definition, or None if it cannot be parsed"""
+        try:
+            return self.ud_fl.parse(doc.sentences[0], "ud", "fl", "amr-sgraph-src")
+        except (TypeError, IndexError, KeyError, ValueError):
+            logger.error(
+                f"failed to parse definition: {definition}\n{traceback.format_exc()}"
+            )
+            return None
+
+    def prewarm_definition_cache(self, batch_size=32):
+        """parse the definitions of all dictionary headwords that are not yet
+        in the definition cache"""
+        for batch in chunks(self.lexicon.items(), 1000 * batch_size):
+            self.parse_definitions(batch, batch_size)
+
+    def get_definition_graphs(self, words_definitions):
+        """Returns the definition graph and its root for each word of a list of
+        (word, definition) pairs, looking them up in the precomputed definition
+        graph or parsing them all at once. Words whose definition could not be
+        parsed are left out."""
+        words_definitions = list(dict.fromkeys(words_definitions))
+        todo = [
+            (word, definition)
+            for word, definition in words_definitions
+            if self.definition_graph is None or word not in self.definition_graph
+        ]
+        fls = self.parse_definitions(todo)
+
+        graphs = {}
+        for word, definition in words_definitions:
+            if (word, definition) not in fls:
+                graphs[word] = self.definition_graph.get_graph(word, self.graph_lexical)
+            elif fls[word, definition] is None:
+                logger.warning(f"could not parse definition of {word}: {definition}")
+            else:
+                graphs[word] = self.fl_to_graph(fls[word, definition])
+        return graphs
+
+    def get_definition_fourlang(self, def_graph, root, strategy):
+        """Returns the 4lang graph of a definition and whether it should be
+        merged"""
         fourlang_graph = FourLang(def_graph, root, self.graph_lexical)
-        if len(def_graph.nodes()) > 0:
-            if strategy == "None":
-                graph.merge_definition_graph(fourlang_graph, node, substitute)
-            elif strategy == "whitelisting":
-                fourlang_graph.whitelisting()
-                graph.merge_definition_graph(fourlang_graph, node, substitute)
+        if len(def_graph.nodes()) == 0:
+            return fourlang_graph, False
+        if strategy == "whitelisting":
+            fourlang_graph.whitelisting()
+        return fourlang_graph, strategy in ("None", "whitelisting")
+
+    def add_definition(self, graph, node, definition, substitute, strategy, word=None):
+        if word is None:
+            word = graph.d_clean(graph.G.nodes[node]["name"]).split("_")[0]
+        parsed = None
+        if self.definition_graph is not None:
+            parsed = self.definition_graph.get_graph(word, self.graph_lexical)
+        if parsed is None:
+            parsed = self.fl_to_graph(self.parse_definition(word, definition))
+        fourlang_graph, merge = self.get_definition_fourlang(*parsed, strategy)
+        if merge:
+            graph.merge_definition_graph(fourlang_graph, node, substitute)
 
         return [node[1]["name"] for node in fourlang_graph.G.nodes(data=True)]
 
     def expand(
         self, graph, depth=1, substitute=False, expand_set=set(), strategy="None"
     ):
+        """Adds the definitions of nodes to graph, depth levels deep. The
+        definitions of all nodes of one level are parsed in one batch and
+        merged at once."""
         if depth == 0:
             return
 
+        # definitions are merged in place, node data is copied so that flags
+        # set during this level are not seen until the next one
         if not expand_set:
-            nodes = [node for node in graph.G.nodes(data=True)]
+            nodes = [(node, dict(data)) for node, data in graph.G.nodes(data=True)]
         else:
             nodes = [
-                node
-                for node in graph.G.nodes(data=True)
-                if node[1]["name"] in expand_set
+                (node, dict(data))
+                for node, data in graph.G.nodes(data=True)
+                if data["name"] in expand_set
             ]
+
+        frontier = []
         for d_node, node_data in nodes:
             if all(elem not in node_data for elem in ["expanded", "substituted"]):
                 node = graph.d_clean(node_data["name"]).split("_")[0]
                 if node not in self.lexicon.stopwords or d_node == graph.root:
                     definition = self.lexicon.get_definition(node)
                     if definition:
-                        definition_nodes = self.add_definition(
-                            graph, d_node, definition, substitute, strategy
-                        )
-                        if expand_set:
-                            expand_set |= set(definition_nodes)
+                        frontier.append((d_node, node, definition))
                     else:
                         print("no definition for " + node)
 
+        definition_graphs = self.get_definition_graphs(
+            (word, definition) for _, word, definition in frontier
+        )
+        definitions = []
+        for d_node, word, _ in frontier:
+            if word not in definition_graphs:
+                continue
+            fourlang_graph, merge = self.get_definition_fourlang(
+                *definition_graphs[word], strategy
+            )
+            if merge:
+                definitions.append((fourlang_graph, d_node))
+            if expand_set:
+                expand_set |= {name for _, name in fourlang_graph.G.nodes(data="name")}
+        graph.merge_many(definitions, substitute)
+
         self.expand(
             graph,
             depth - 1,
@@ -88,7 +282,13 @@ class TextTo4lang:
 
     def parse(self, sen):
         fl = self.ud_fl.parse(sen, "ud", "fl", "amr-sgraph-src")
+        return self.fl_to_graph(fl)
+
+    def parse_batch(self, sens):
+        fls = self.ud_fl.parse_batch(sens, "ud", "fl", "amr-sgraph-src")
+        return [self.fl_to_graph(fl) for fl in fls]
 
+    def fl_to_graph(self, fl):
         graph, root = pn_to_graph(fl)
 
         relabeled_graph = self.graph_lexical.from_plain(graph)
@@ -106,29 +306,90 @@ class TextTo4lang:
         strategy="None",
         ssplit=True,
     ):
-        for sen in self.nlp(text, ssplit=ssplit).sentences:
-            graph, root = self.parse(sen)
+        sens = self.nlp(text, ssplit=ssplit).sentences
+        fls = self.ud_fl.parse_batch(sens, "ud", "fl", "amr-sgraph-src")
+        yield from self.gen_fourlang_graphs(
+            text,
+            sens,
+            fls,
+            depth=depth,
+            substitute=substitute,
+            expand_set=expand_set,
+            strategy=strategy,
+        )
+
+    def gen_fourlang_graphs(self, text, sens, fls, depth, **kwargs):
+        for sen, fl in zip(sens, fls):
+            graph, root = self.fl_to_graph(fl)
 
             tokens = [token.text for token in sen.tokens]
             fourlang = FourLang(
                 graph, root, self.graph_lexical, ud_graph=sen, text=text, tokens=tokens
             )
 
-            self.expand(
-                fourlang,
-                depth=depth,
-                substitute=substitute,
-                expand_set=expand_set,
-                strategy=strategy,
-            )
+            self.expand(fourlang, depth=depth, **kwargs)
             yield fourlang
 
+    def pipe(
+        self,
+        texts,
+        batch_size=32,
+        depth=0,
+        substitute=False,
+        expand_set=set(),
+        strategy="None",
+        ssplit=True,
+    ):
+        """Parse an iterable of texts, batch_size texts at a time.
+
+        The sentences of a batch are passed to stanza and ALTO together.
+        Yields the list of 4lang graphs of each text, or None if the text
+        could not be parsed.
+        """
+        kwargs = {
+            "depth": depth,
+            "substitute": substitute,
+            "expand_set": expand_set,
+            "strategy": strategy,
+        }
+        for batch in chunks(texts, batch_size):
+            docs = list(self.nlp.pipe(batch, ssplit=ssplit, batch_size=batch_size))
+            try:
+                fls = self.ud_fl.parse_batch(
+                    [sen for doc in docs for sen in doc.sentences],
+                    "ud",
+                    "fl",
+                    "amr-sgraph-src",
+                )
+            except (TypeError, IndexError, KeyError):
+                # parse texts one by one so that errors only affect their own text
+                fls = None
+
+            offset = 0
+            for text, doc in zip(batch, docs):
+                sens = doc.sentences
+                try:
+                    if fls is None:
+                        doc_fls = self.ud_fl.parse_batch(
+                            sens, "ud", "fl", "amr-sgraph-src"
+                        )
+                    else:
+                        doc_fls = fls[offset : offset + len(sens)]
+                    yield list(self.gen_fourlang_graphs(text, sens, doc_fls, **kwargs))
+                except (TypeError, IndexError, KeyError):
+                    logger.error(
+                        f"failed to parse text: {text}\n{traceback.format_exc()}"
+                    )
+                    yield None
+                offset += len(sens)
+
     def __enter__(self):
         self.nlp.__enter__()
         return self
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
         self.nlp.__exit__(exc_type, exc_value, exc_traceback)
+        self.ud_fl.close()
 
 
 def get_args():
@@ -139,7 +400,97 @@ def get_args():
     parser.add_argument("-d", "--depth", default=0, type=int)
     parser.add_argument("-s", "--substitute", default=False, type=bool)
     parser.add_argument("-p", "--preprocessor", default=None, type=str)
-    return parser.parse_args()
+    parser.add_argument("-pa", "--persistent-alto", action="store_true")
+    parser.add_argument("-b", "--batch-size", default=32, type=int)
+    parser.add_argument("-w", "--workers", default=1, type=int)
+    parser.add_argument("-dc", "--definition-cache", default=None, type=str)
+    parser.add_argument("-dg", "--definition-graph", default=None, type=str)
+    parser.add_argument(
+        "--prewarm",
+        action="store_true",
+        help="parse all dictionary definitions into the definition cache and exit",
+    )
+    args = parser.parse_args()
+    if args.prewarm and args.definition_cache is None:
+        parser.error("--prewarm requires --definition-cache")
+    return args
+
+
+def gen_pn_lines(tfl, texts, batch_size):
+    for fl_graphs in tfl.pipe(texts, batch_size=batch_size):
+        if fl_graphs is None:
+            yield None
+        else:
+            yield "\t".join(fl.to_penman() for fl in fl_graphs)
+
+
+_worker_tfl = None
+
+
+def init_worker(
+    lang,
+    nlp_cache,
+    cache_dir,
+    persistent_alto,
+    definition_cache=None,
+    definition_graph=None,
+):
+    global _worker_tfl
+    # each worker gets a single core, parallelism comes from the pool
+    torch.set_num_threads(1)
+    _worker_tfl = TextTo4lang(
+        lang,
+        nlp_cache,
+        cache_dir,
+        persistent_alto,
+        definition_cache,
+        definition_graph=definition_graph,
+    )
+    _worker_tfl.__enter__()
+    Finalize(None, _worker_tfl.__exit__, args=(None, None, None), exitpriority=10)
+
+
+def parse_chunk(texts):
+    return list(gen_pn_lines(_worker_tfl, texts, len(texts)))
+
+
+def parse_parallel(texts, args):
+    """Parse texts in a pool of worker processes, preserving their order.
+
+    Every worker has its own TextTo4lang instance. The NLP and ALTO caches
+    are SQLite files that all workers read and write concurrently.
+    """
+    pool = Pool(
+        args.workers,
+        initializer=init_worker,
+        initargs=(
+            args.lang,
+            args.nlp_cache,
+            args.cache_dir,
+            args.persistent_alto,
+            args.definition_cache,
+            args.definition_graph,
+        ),
+    )
+    try:
+        for pn_lines in pool.imap(parse_chunk, chunks(texts, args.batch_size)):
+            yield from pn_lines
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def print_pn_lines(pn_lines):
+    for i, pn_line in tqdm(enumerate(pn_lines)):
+        if pn_line is None:
+            sys.stderr.write(f"error on line {i}\n")
+            print("ERROR")
+            continue
+
+        print(pn_line)
 
 
 def main():
@@ -149,19 +500,32 @@ def main():
     )
     logging.getLogger().setLevel(logging.WARNING)
     args = get_args()
+    if args.prewarm:
+        with TextTo4lang(
+            args.lang,
+            args.nlp_cache,
+            args.cache_dir,
+            args.persistent_alto,
+            args.definition_cache,
+        ) as tfl:
+            tfl.prewarm_definition_cache(args.batch_size)
+        return
+
     preproc = Preprocessor(args.preprocessor)
-    with TextTo4lang(args.lang, args.nlp_cache, args.cache_dir) as tfl:
-        for i, line in tqdm(enumerate(sys.stdin)):
-            try:
-                fl_graphs = list(tfl(preproc(line.strip())))
-            except (TypeError, IndexError, KeyError):
-                traceback.print_exc()
-                sys.stderr.write(f"error on line {i}: {line}")
-                print("ERROR")
-                continue
-                # sys.exit(-1)
+    texts = (preproc(line.strip()) for line in sys.stdin)
 
-            print("\t".join(graph_to_pn(fl) for fl in fl_graphs))
+    if args.workers > 1:
+        print_pn_lines(parse_parallel(texts, args))
+    else:
+        with TextTo4lang(
+            args.lang,
+            args.nlp_cache,
+            args.cache_dir,
+            args.persistent_alto,
+            args.definition_cache,
+            definition_graph=args.definition_graph,
+        ) as tfl:
+            print_pn_lines(gen_pn_lines(tfl, texts, args.batch_size))
 
 
 if __name__ == "__main__":
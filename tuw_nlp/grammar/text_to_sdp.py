@@ -2,7 +2,7 @@ from conllu import parse
 from supar import Parser
 
 from tuw_nlp.graph.sdp_graph import SDPGraph
-from tuw_nlp.text.pipeline import CustomStanzaPipeline
+from tuw_nlp.text.pipeline import LANG_PIPELINES, get_pipeline
 
 
 class TextToSDP:
@@ -14,9 +14,9 @@ class TextToSDP:
         assert lang == "en", "TextToSDP only supports english currently"
         self.sdp = Parser.load("biaffine-sdp-en")
 
-        self.nlp = CustomStanzaPipeline(
-            "en", processors="tokenize,mwt,pos,lemma,depparse"
-        )
+    @property
+    def nlp(self):
+        return get_pipeline(**LANG_PIPELINES["en"])
 
     def __call__(self, text):
         sdp_input = []
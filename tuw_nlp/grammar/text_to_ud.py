@@ -1,27 +1,36 @@
+from tuw_nlp.common.utils import chunks
 from tuw_nlp.graph.ud_graph import UDGraph
-from tuw_nlp.text.pipeline import CachedStanzaPipeline, CustomStanzaPipeline
+from tuw_nlp.text.pipeline import (
+    LANG_PIPELINES,
+    CachedStanzaPipeline,
+    get_lazy_pipeline,
+)
 
 
 class TextToUD:
     def __init__(self, lang, nlp_cache, cache_dir=None):
-        if lang == "de":
-            nlp = CustomStanzaPipeline(processors="tokenize,mwt,pos,lemma,depparse")
-        elif lang == "en":
-            nlp = CustomStanzaPipeline(
-                "en", processors="tokenize,mwt,pos,lemma,depparse"
-            )
-        elif lang == "en_bio":
-            nlp = CustomStanzaPipeline("en", package="craft")
         assert lang, "TextTo4lang does not have lang set"
 
         self.lang = lang
 
-        self.nlp = CachedStanzaPipeline(nlp, nlp_cache)
+        self.nlp = CachedStanzaPipeline(
+            None, nlp_cache, init=get_lazy_pipeline(**LANG_PIPELINES[lang])
+        )
 
-    def __call__(self, text, ssplit=True):
-        for sen in self.nlp(text, ssplit=ssplit).sentences:
+    def gen_ud_graphs(self, text, doc):
+        for sen in doc.sentences:
             tokens = [token.text for token in sen.tokens]
 
             ud_graph = UDGraph(sen, text, tokens)
 
             yield ud_graph
+
+    def pipe(self, texts, batch_size=32, ssplit=True):
+        """yield the list of UD graphs of each text, parsing texts in batches"""
+        for batch in chunks(texts, batch_size):
+            docs = self.nlp.pipe(batch, ssplit=ssplit, batch_size=batch_size)
+            for text, doc in zip(batch, docs):
+                yield list(self.gen_ud_graphs(text, doc))
+
+    def __call__(self, text, ssplit=True):
+        yield from self.gen_ud_graphs(text, self.nlp(text, ssplit=ssplit))
@@ -22,6 +22,7 @@ class UD_FL(IRTGGrammar):
 
         lexicon_map = {"en": ENLexicon(), "en_bio": ENLexicon(), "de": CFLLexicon()}
         self.lexicon = lexicon_map[self.lang]
+        self.dependency_rules = {}
 
     def preprocess_input(self, input_sen):
         self.input_graph = sen_to_graph(input_sen)
@@ -37,6 +38,29 @@ class UD_FL(IRTGGrammar):
                 "nonterminal",
             )
 
+    def get_dependency_rule_tuples(self, pos, deprel, cpos):
+        """rules of a dependency edge, computed once per (pos, deprel, cpos)"""
+        key = (pos, deprel, cpos)
+        if key not in self.dependency_rules:
+            self.dependency_rules[key] = tuple(
+                self.gen_dependency_rules(pos, deprel, cpos)
+            )
+        return self.dependency_rules[key]
+
+    def gen_dependency_rules(self, pos, deprel, cpos):
+        binary_fss = self.lexicon.get_dependency_rules(pos, deprel, cpos)
+        for k, binary_fs in enumerate(binary_fss):
+            yield (
+                f"{pos} -> {pos}_{deprel}_{cpos}_{k}({deprel}_{cpos}, {pos}) [0.1]",  # noqa
+                {"ud": f"{pos}_2(?1, ?2)", "fl": f"{binary_fs}"},
+                "nonterminal",
+            )
+        yield (
+            f"{deprel}_{cpos} -> _{deprel}_{cpos}({cpos})",
+            {"ud": f"_{deprel}_1(?1)", "fl": "?1"},
+            "nonterminal",
+        )
+
     def gen_rules_rec(self, graph, i, parent=None):
         node = graph.nodes[i]
         lemma = preprocess_node_alto(preprocess_lemma(node["lemma"]))
@@ -50,18 +74,7 @@ class UD_FL(IRTGGrammar):
             deprel = preprocess_edge_alto(edge["deprel"])
             cpos = cnode["upos"]
 
-            binary_fss = self.lexicon.get_dependency_rules(pos, deprel, cpos)
-            for k, binary_fs in enumerate(binary_fss):
-                yield (
-                    f"{pos} -> {pos}_{deprel}_{cpos}_{k}({deprel}_{cpos}, {pos}) [0.1]",  # noqa
-                    {"ud": f"{pos}_2(?1, ?2)", "fl": f"{binary_fs}"},
-                    "nonterminal",
-                )
-            yield (
-                f"{deprel}_{cpos} -> _{deprel}_{cpos}({cpos})",
-                {"ud": f"_{deprel}_1(?1)", "fl": "?1"},
-                "nonterminal",
-            )
+            yield from self.get_dependency_rule_tuples(pos, deprel, cpos)
 
             if parent:
                 subgraphs = self.lexicon.handle_subgraphs(
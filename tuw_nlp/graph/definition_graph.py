@@ -0,0 +1,146 @@
+import networkx as nx
+import numpy as np
+
+from tuw_nlp.common.vocabulary import Vocabulary
+from tuw_nlp.graph.utils import pn_to_graph
+
+
+def to_csr(lists, dtype=np.int64):
+    """Returns the concatenation of lists and the offsets of each list"""
+    indptr = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(values) for values in lists], out=indptr[1:])
+    values = np.fromiter(
+        (value for values in lists for value in values), dtype=dtype, count=indptr[-1]
+    )
+    return indptr, values
+
+
+class DefinitionGraph:
+    """The 4lang graphs of the definitions of all dictionary headwords.
+
+    Concepts and edge colors are stored as ids of a shared Vocabulary. The
+    nodes and edges of the graph of the n-th headword are the slices
+    indptr[n]:indptr[n+1] of flat NumPy arrays, so that the graph of a
+    headword can be looked up without parsing its definition.
+    """
+
+    ARRAYS = (
+        "headwords",
+        "roots",
+        "node_indptr",
+        "nodes",
+        "token_ids",
+        "edge_indptr",
+        "sources",
+        "targets",
+        "colors",
+    )
+
+    def __init__(self, vocab, **arrays):
+        self.vocab = vocab
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.index = {
+            vocab.get_word(word_id): i for i, word_id in enumerate(self.headwords)
+        }
+
+    @staticmethod
+    def from_penman(items):
+        """build from an iterable of (headword, definition graph in penman)"""
+        vocab = Vocabulary()
+        headwords, roots, nodes, token_ids, edges = [], [], [], [], []
+        for word, fl in items:
+            graph, root = pn_to_graph(fl)
+            # same relabeling as in LexGraphs.from_plain
+            G = nx.relabel_nodes(
+                graph, lambda n: vocab.get_id(graph.nodes[n]["name"], allow_new=True)
+            )
+            headwords.append(vocab.get_id(word, allow_new=True))
+            roots.append(vocab.get_id(graph.nodes[root]["name"]))
+            nodes.append(list(G.nodes))
+            token_ids.append(
+                [-1 if tok is None else tok for _, tok in G.nodes(data="token_id")]
+            )
+            edges.append(
+                [
+                    (u, v, vocab.get_id(str(color), allow_new=True))
+                    for u, v, color in G.edges(data="color")
+                ]
+            )
+
+        node_indptr, node_array = to_csr(nodes)
+        _, token_id_array = to_csr(token_ids)
+        edge_indptr, sources = to_csr([[u for u, _, _ in e] for e in edges])
+        _, targets = to_csr([[v for _, v, _ in e] for e in edges])
+        _, colors = to_csr([[c for _, _, c in e] for e in edges])
+        return DefinitionGraph(
+            vocab,
+            headwords=np.array(headwords, dtype=np.int64),
+            roots=np.array(roots, dtype=np.int64),
+            node_indptr=node_indptr,
+            nodes=node_array,
+            token_ids=token_id_array,
+            edge_indptr=edge_indptr,
+            sources=sources,
+            targets=targets,
+            colors=colors,
+        )
+
+    def save(self, fn):
+        words = np.array([self.vocab.get_word(i) for i in range(len(self.vocab))])
+        # np.savez would append .npz to a file name without that suffix
+        with open(fn, "wb") as f:
+            np.savez(
+                f, words=words, **{name: getattr(self, name) for name in self.ARRAYS}
+            )
+
+    @staticmethod
+    def load(fn):
+        with np.load(fn) as data:
+            vocab = Vocabulary()
+            for word in data["words"]:
+                vocab.add(str(word))
+            return DefinitionGraph(
+                vocab, **{name: data[name] for name in DefinitionGraph.ARRAYS}
+            )
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def get_graph(self, word, lexical):
+        """Returns the definition graph of word and its root, with node ids
+        from the vocabulary of the LexGraphs lexical, or None if word is not
+        a headword"""
+        i = self.index.get(word)
+        if i is None:
+            return None
+
+        def get_id(word_id):
+            return lexical.vocab.get_id(self.vocab.get_word(word_id), allow_new=True)
+
+        G = nx.DiGraph()
+        start, end = self.node_indptr[i], self.node_indptr[i + 1]
+        for word_id, tok in zip(
+            self.nodes[start:end].tolist(), self.token_ids[start:end].tolist()
+        ):
+            G.add_node(
+                get_id(word_id),
+                name=self.vocab.get_word(word_id),
+                token_id=None if tok == -1 else tok,
+            )
+
+        start, end = self.edge_indptr[i], self.edge_indptr[i + 1]
+        for u, v, color in zip(
+            self.sources[start:end].tolist(),
+            self.targets[start:end].tolist(),
+            self.colors[start:end].tolist(),
+        ):
+            color = self.vocab.get_word(color)
+            G.add_edge(
+                get_id(u), get_id(v), color=int(color) if color.isnumeric() else color
+            )
+
+        return G, get_id(int(self.roots[i]))
@@ -1,5 +1,6 @@
+from itertools import chain
+
 import networkx as nx
-from networkx import algorithms
 
 from tuw_nlp.graph.graph import Graph
 
@@ -18,68 +19,113 @@ class FourLang(Graph):
         self.expanded = False
 
     def merge_definition_graph(self, graph, node, substitute=False):
+        """Add the definition graph of node to this graph in place. Attributes
+        from the definition graph take precedence, as in nx.compose"""
         if graph.root != None:
             graph_root = graph.root
-            F = nx.compose(self.G, graph.G)
+            self.G.graph.update(graph.G.graph)
+            self.G.add_nodes_from(graph.G.nodes(data=True))
+            self.G.add_edges_from(graph.G.edges(data=True))
             if substitute:
-                F = nx.relabel_nodes(F, {node: graph_root})
+                self.substitute_node(node, graph_root)
                 if node == self.root:
                     self.root = graph_root
-                F.nodes[graph_root]["substituted"] = True
+                self.G.nodes[graph_root]["substituted"] = True
             else:
-                F.add_edge(node, graph_root, color=0)
-                F.nodes[node]["expanded"] = True
-            self.G = F
+                self.G.add_edge(node, graph_root, color=0)
+                self.G.nodes[node]["expanded"] = True
+
+    def merge_many(self, definitions, substitute=False):
+        """merge a list of (definition graph, node) pairs, in order"""
+        for graph, node in definitions:
+            self.merge_definition_graph(graph, node, substitute)
+
+    def substitute_node(self, node, new_node):
+        """Replace node by new_node, keeping the attributes of new_node and of
+        its edges"""
+        if node == new_node or node not in self.G:
+            return
+
+        def relabel(n):
+            return new_node if n == node else n
+
+        edges = [
+            (relabel(u), relabel(v), data)
+            for u, v, data in chain(
+                self.G.in_edges(node, data=True), self.G.out_edges(node, data=True)
+            )
+        ]
+        self.G.remove_node(node)
+        self.G.add_edges_from(
+            (u, v, data) for u, v, data in edges if not self.G.has_edge(u, v)
+        )
 
-    def append_zero_paths(self):
-        edges = []
-        for edge in self.G.edges(data=True):
-            X = edge[0]
-            Y = edge[1]
-            color = edge[2]["color"]
+    def merge(self, graph):
+        self.G.graph.update(graph.G.graph)
+        self.G.add_nodes_from(graph.G.nodes(data=True))
+        self.G.add_edges_from(graph.G.edges(data=True))
 
-            zero_graph, nodes_to_append = self.find_zero_paths(Y)
+    def append_zero_paths(self):
+        zero_nodes, zero_edges = self.get_zero_edges()
+        zero_graph = nx.DiGraph()
+        zero_graph.add_nodes_from(zero_nodes)
+        zero_graph.add_edges_from(zero_edges)
+        whitelists = {}
+
+        def get_whitelist(from_node):
+            if not from_node:
+                from_node = self.root
+            if from_node not in whitelists:
+                whitelists[from_node] = self.get_whitelist(
+                    zero_graph, zero_nodes, from_node
+                )
+            return whitelists[from_node]
 
-            for node in nodes_to_append:
-                if X != node:
-                    edges.append((X, node, color))
+        edges = []
+        for X, Y, color in self.G.edges(data="color"):
+            edges += [(X, node, color) for node in get_whitelist(Y) if X != node]
 
-            zero_graph, nodes_to_append = self.find_zero_paths(X)
-            for node in nodes_to_append:
-                node_edges = self.G.edges(node, data=True)
-                for n in node_edges:
-                    n_color = n[2]["color"]
-                    if X != n[1]:
-                        edges.append((X, n[1], n_color))
+            for node in get_whitelist(X):
+                edges += [
+                    (X, n, n_color)
+                    for _, n, n_color in self.G.edges(node, data="color")
+                    if X != n
+                ]
 
         edges = list(set(edges))
         for edge in edges:
             self.G.add_edge(edge[0], edge[1], color=edge[2])
 
+    def get_zero_edges(self):
+        """Returns the edges of color 0 and their nodes in order of appearance"""
+        zero_edges = [(u, v) for u, v, color in self.G.edges(data="color") if not color]
+        zero_nodes = list(dict.fromkeys(n for edge in zero_edges for n in edge))
+        return zero_nodes, zero_edges
+
+    @staticmethod
+    def get_whitelist(zero_graph, zero_nodes, from_node):
+        """nodes reachable from from_node on edges of color 0, in the order of
+        zero_nodes"""
+        if from_node not in zero_graph:
+            return []
+        reachable = nx.descendants(zero_graph, from_node)
+        return [node for node in zero_nodes if node in reachable and node != from_node]
+
     def find_zero_paths(self, from_node=None):
         if not from_node:
             from_node = self.root
-        whitelist = []
+        zero_nodes, zero_edges = self.get_zero_edges()
         zero_graph = nx.DiGraph()
         zero_graph.add_node(from_node, name=self.G.nodes[from_node]["name"])
-        delete_list = []
-        for edge in self.G.edges(data=True):
-            if not edge[2]["color"]:
-                if edge[0] not in zero_graph.nodes():
-                    zero_graph.add_node(edge[0], name=self.G.nodes[edge[0]]["name"])
-                if edge[1] not in zero_graph.nodes():
-                    zero_graph.add_node(edge[1], name=self.G.nodes[edge[1]]["name"])
-                zero_graph.add_edge(edge[0], edge[1], color=0)
-
-        for node in zero_graph.nodes(data=True):
-            node_name = node[0]
-            if algorithms.has_path(zero_graph, from_node, node_name):
-                if node_name != from_node:
-                    whitelist.append(node_name)
-            else:
-                delete_list.append(node_name)
-
-        zero_graph.remove_nodes_from(delete_list)
+        for node in zero_nodes:
+            if node not in zero_graph:
+                zero_graph.add_node(node, name=self.G.nodes[node]["name"])
+        zero_graph.add_edges_from(zero_edges, color=0)
+
+        whitelist = self.get_whitelist(zero_graph, zero_nodes, from_node)
+        zero_graph.remove_nodes_from(
+            [node for node in zero_nodes if node not in whitelist and node != from_node]
+        )
 
         return zero_graph, whitelist
 
@@ -88,10 +134,6 @@ class FourLang(Graph):
 
         self.G = zero_graph
 
-    def merge(self, graph):
-        F = nx.compose(self.G, graph.G)
-        self.G = F
-
     def get_nodes(self):
         nodes_cleaned = []
         nodes = self.G.nodes(data=True)
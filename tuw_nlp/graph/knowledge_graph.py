@@ -6,7 +6,6 @@ from collections import Counter
 import conceptnet_lite
 import networkx as nx
 import nltk
-import stanza
 from conceptnet_lite import Concept, Label, edges_between
 from conceptnet_lite.db import RelationName
 from networkx.algorithms.isomorphism import DiGraphMatcher
@@ -19,7 +18,7 @@ from nltk.wsd import lesk
 from pywsd.lesk import adapted_lesk, cosine_lesk, original_lesk, simple_lesk
 
 from tuw_nlp.graph.graph import Graph
-from tuw_nlp.text.pipeline import CachedStanzaPipeline
+from tuw_nlp.text.pipeline import CachedStanzaPipeline, get_lazy_pipeline
 
 # Download wordnet
 basepath = os.path.dirname(__file__)
@@ -217,8 +216,9 @@ class KnowledgeGraph(Graph):
             pipeline
             if pipeline is not None
             else CachedStanzaPipeline(
-                stanza.Pipeline(lang, processors="tokenize,mwt,pos,lemma,depparse"),
+                None,
                 "cache",
+                init=get_lazy_pipeline(lang, "tokenize,mwt,pos,lemma,depparse"),
             )
         )
         self.lang = lang
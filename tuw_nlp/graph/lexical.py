@@ -4,7 +4,7 @@ from networkx.convert import to_dict_of_dicts as tdd
 
 from tuw_nlp.common.vocabulary import Vocabulary
 from tuw_nlp.graph.graph import Graph
-from tuw_nlp.graph.utils import gen_subgraphs
+from tuw_nlp.graph.utils import gen_connected_edge_sets, gen_subgraphs
 
 
 class LexGraphs(Graph):
@@ -52,3 +52,23 @@ class LexGraphs(Graph):
                 continue
             seen_tuples.add(sgraph_tuple)
             yield sgraph_tuple, sgraph
+
+    def gen_lex_subgraph_tuples(self, G, n):
+        """Yield each connected subgraph of G with at most n edges once, in
+        the tuple format of _dict_to_tuple"""
+        H = self.from_plain(G)
+        H.remove_edges_from(nx.selfloop_edges(H))
+        for node in H.nodes:
+            yield ((node, ()),)
+
+        edges = list(H.edges(data="color"))
+        for edge_set in gen_connected_edge_sets([(u, v) for u, v, _ in edges], n):
+            adjacency = {}
+            for i in edge_set:
+                u, v, color = edges[i]
+                adjacency.setdefault(u, []).append((v, color))
+                adjacency.setdefault(v, [])
+
+            yield tuple(
+                sorted((node, tuple(sorted(out))) for node, out in adjacency.items())
+            )
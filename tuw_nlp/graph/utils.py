@@ -1,13 +1,17 @@
 import logging
 import re
+from collections import Counter
 from copy import deepcopy
-from itertools import chain, product
+from functools import lru_cache
+from itertools import product
+from multiprocessing import Pool
 
 import networkx as nx
 import penman as pn
 from networkx.algorithms.isomorphism import DiGraphMatcher
 
 from tuw_nlp import logger
+from tuw_nlp.common.utils import chunks
 from tuw_nlp.text.patterns.misc import (
     CHAR_REPLACEMENTS,
     MISC_REPLACEMENTS,
@@ -15,13 +19,119 @@ from tuw_nlp.text.patterns.misc import (
 )
 from tuw_nlp.text.utils import replace_emojis
 
-
 dummy_isi_graph = "(dummy_0 / dummy_0)"
 dummy_tree = "dummy(dummy)"
 
+LITERAL_LABEL_PATT = re.compile(r"\w+", re.ASCII)
+LABEL_KEY_PATT = re.compile(r"\w+")
+# non-ASCII characters that match ASCII letters under re.IGNORECASE
+CASE_FOLD_TABLE = str.maketrans({"ı": "i", "İ": "i", "ſ": "s", "K": "k"})
+
+
+def get_label_key(label, case_sensitive):
+    """Returns the leading word of a node name or edge color. A pattern label
+    that is a single ASCII word only matches host labels with the same key."""
+    match = LABEL_KEY_PATT.match(str(label))
+    if match is None:
+        return None
+    key = match.group()
+    return key if case_sensitive else key.translate(CASE_FOLD_TABLE).lower()
+
+
+def get_pattern_key(label, case_sensitive):
+    """Returns the key of a pattern label, or None if it is not a literal"""
+    if label is None or not LITERAL_LABEL_PATT.fullmatch(str(label)):
+        return None
+    return get_label_key(label, case_sensitive)
+
+
+def count_missing(required, available):
+    return sum(max(0, n - available[key]) for key, n in required.items())
+
+
+def compile_label_test(label, case_sensitive, is_node=True):
+    """Returns a (key, regex, label) triple used by label_matches. Literal
+    labels are compared by their keys, other labels are matched by a regex
+    compiled here once. Node names are also compared for equality."""
+    key = get_pattern_key(label, case_sensitive)
+    if key is not None:
+        return key, None, None
+    flags = 0 if case_sensitive else re.IGNORECASE
+    return None, re.compile(rf"\b({label})\b", flags), label if is_node else None
+
+
+def label_matches(test, host_label, host_key):
+    """Same result as GraphFormulaPatternMatcher.node_matcher (or
+    edge_matcher, for tests compiled with is_node=False)"""
+    key, regex, label = test
+    if key is not None:
+        return key == host_key
+    return regex.match(host_label) is not None or (
+        label is not None and label == host_label
+    )
+
+
+class CompiledDiGraphMatcher(DiGraphMatcher):
+    """A DiGraphMatcher that compares the labels of a host graph and a
+    pattern using the precomputed keys of the host labels and the tests
+    compiled for each pattern node and edge, see
+    GraphFormulaPatternMatcher.get_host_labels and compile_pattern"""
+
+    def __init__(self, graph, pattern, host_labels, pattern_tests):
+        super(CompiledDiGraphMatcher, self).__init__(graph, pattern)
+        self.host_nodes, self.host_edges = host_labels
+        self.node_tests, self.edge_tests = pattern_tests
+
+    def semantic_feasibility(self, G1_node, G2_node):
+        test = self.node_tests[G2_node]
+        name, key = self.host_nodes[G1_node]
+        if test is not None and name is not None:
+            if not label_matches(test, name, key):
+                return False
+
+        return self.edges_match(G1_node, G2_node, False) and self.edges_match(
+            G1_node, G2_node, True
+        )
+
+    def edges_match(self, G1_node, G2_node, reverse):
+        """Checks the pattern edges between G2_node and the pattern nodes
+        mapped so far, like vf2userfunc.DiGraphMatcher"""
+        G1_nbrs = self.G1.pred[G1_node] if reverse else self.G1.adj[G1_node]
+        G2_nbrs = self.G2.pred[G2_node] if reverse else self.G2.adj[G2_node]
+        for neighbor in G1_nbrs:
+            if neighbor == G1_node:
+                G2_nbr = G2_node
+            elif neighbor in self.core_1:
+                G2_nbr = self.core_1[neighbor]
+            else:
+                continue
+            if G2_nbr not in G2_nbrs:
+                continue
+
+            if reverse:
+                host_edge, patt_edge = (neighbor, G1_node), (G2_nbr, G2_node)
+            else:
+                host_edge, patt_edge = (G1_node, neighbor), (G2_node, G2_nbr)
+            color, key = self.host_edges[host_edge]
+            if not label_matches(self.edge_tests[patt_edge], color, key):
+                return False
+
+        return True
 
-class GraphFormulaPatternMatcher:
 
+_corpus_matcher = None
+
+
+def _init_corpus_matcher(matcher):
+    global _corpus_matcher
+    _corpus_matcher = matcher
+
+
+def _match_chunk(indexed_graphs):
+    return list(_corpus_matcher._gen_corpus_matches(indexed_graphs))
+
+
+class GraphFormulaPatternMatcher:
     """
     Rule examples:
         1.) 3((u_800 / motion),(u_120 / swift))
@@ -112,12 +222,108 @@ class GraphFormulaPatternMatcher:
             re.compile(r"^undirected\((.*),(.*)\)"): self.undirected,
         }
         self.patts = []
+        self.pattern_tests = {}
+        self.reset_graph_cache()
 
         for patts, negs, key in patterns:
             pos_patts = self.patt_list(patts, converter)
             neg_graphs = self.patt_list(negs, converter)
             self.patts.append((pos_patts, neg_graphs, key))
 
+        self.build_index()
+
+    def get_requirements(self, pattern, directed=True):
+        """Returns the number of nodes and edges of a pattern graph and the
+        keys of its literal node names and edge colors"""
+        node_keys = Counter()
+        for _, name in pattern.nodes(data="name"):
+            key = get_pattern_key(name, self.case_sensitive)
+            if key is not None:
+                node_keys[key] += 1
+
+        edge_keys = Counter()
+        if directed:
+            for _, _, color in pattern.edges(data="color"):
+                key = get_pattern_key(color, self.case_sensitive)
+                if key is not None:
+                    edge_keys[key] += 1
+
+        n_edges = len(pattern.edges) if directed else 0
+        return len(pattern), n_edges, node_keys, edge_keys
+
+    def get_profile(self, graph):
+        """Counts the keys of node names and edge colors of a host graph.
+        Nodes without a name and edges without a color match anything."""
+        nodes, _ = self.get_host_labels(graph)
+        node_keys = Counter(key for name, key in nodes.values() if name is not None)
+        wild_nodes = len(nodes) - sum(node_keys.values())
+
+        edge_keys, wild_edges = Counter(), 0
+        for _, _, data in graph.edges(data=True):
+            if "color" not in data:
+                wild_edges += 1
+            else:
+                edge_keys[self.get_key(data["color"])] += 1
+
+        return (
+            len(graph),
+            len(graph.edges),
+            node_keys,
+            edge_keys,
+            wild_nodes,
+            wild_edges,
+        )
+
+    def build_index(self):
+        """Indexes patterns by one of the literal node names they require, and
+        stores the requirements of each positive pattern graph. Pattern graphs
+        of undirected rules only have requirements on their nodes."""
+        self.requirements = []
+        self.index = {}
+        self.unindexed = []
+        for i, (patt, _, _) in enumerate(self.patts):
+            reqs = []
+            for p in patt:
+                if isinstance(p, tuple):
+                    func, groups = p
+                    directed = func != self.undirected
+                    reqs += [self.get_requirements(g, directed) for g in groups[-2:]]
+                else:
+                    reqs.append(self.get_requirements(p))
+            self.requirements.append(reqs)
+
+            node_keys = [key for req in reqs for key in req[2]]
+            if node_keys:
+                self.index.setdefault(max(node_keys, key=len), []).append(i)
+            else:
+                self.unindexed.append(i)
+
+    def get_candidates(self, graph):
+        """Returns the ids of patterns that may match graph, in order.
+        Patterns requiring more nodes or edges with some label than the graph
+        has are skipped without running the matcher."""
+        profile = self.get_profile(graph)
+        n_nodes, n_edges, node_keys, edge_keys, wild_nodes, wild_edges = profile
+        if wild_nodes > 0:
+            candidates = range(len(self.patts))
+        else:
+            candidates = list(self.unindexed)
+            for key in node_keys:
+                candidates += self.index.get(key, [])
+            candidates.sort()
+
+        return [
+            i
+            for i in candidates
+            if all(
+                p_nodes <= n_nodes
+                and p_edges <= n_edges
+                and count_missing(p_node_keys, node_keys) <= wild_nodes
+                and count_missing(p_edge_keys, edge_keys) <= wild_edges
+                for p_nodes, p_edges, p_node_keys, p_edge_keys in self.requirements[i]
+            )
+        ]
+
     def patt_list(self, patts, converter):
         patt_list = []
         for patt in patts:
@@ -139,8 +345,45 @@ class GraphFormulaPatternMatcher:
                     break
             if not is_reg:
                 patt_list.append(converter(patt)[0])
+
+        for patt in patt_list:
+            graphs = patt[1][-2:] if isinstance(patt, tuple) else [patt]
+            for graph in graphs:
+                self.pattern_tests[graph] = self.compile_pattern(graph)
+
         return patt_list
 
+    def compile_pattern(self, pattern):
+        node_tests = {
+            node: (
+                None if name is None else compile_label_test(name, self.case_sensitive)
+            )
+            for node, name in pattern.nodes(data="name")
+        }
+        edge_tests = {
+            (u, v): compile_label_test(str(color), self.case_sensitive, False)
+            for u, v, color in pattern.edges(data="color")
+        }
+        return node_tests, edge_tests
+
+    def get_host_labels(self, graph):
+        """Returns the names and colors of a host graph together with their
+        keys, computed once per graph during a call to match"""
+        if graph not in self.host_labels:
+            nodes = {
+                node: (name, None if name is None else self.get_key(name))
+                for node, name in graph.nodes(data="name")
+            }
+            edges = {
+                (u, v): (str(color), self.get_key(color))
+                for u, v, color in graph.edges(data="color")
+            }
+            self.host_labels[graph] = nodes, edges
+        return self.host_labels[graph]
+
+    def get_key(self, label):
+        return get_label_key(label, self.case_sensitive)
+
     def max_distance(self, graph, node_data, subgraphs):
         max_dist, node1, node2 = node_data[0], node_data[1], node_data[2]
         node1_matches = []
@@ -154,12 +397,9 @@ class GraphFormulaPatternMatcher:
         for n1, n2 in product(node1_matches, node2_matches):
             n1_root = [n for n, d in n1.in_degree() if d == 0][0]
             n2_root = [n for n, d in n2.in_degree() if d == 0][0]
-            try:
-                if nx.shortest_path_length(graph, n1_root, n2_root) <= max_dist:
-                    subgraphs.append(nx.compose(n1, n2))
-                    return True
-            except:
-                continue
+            if self.is_within_distance(graph, n1_root, n2_root, max_dist):
+                subgraphs.append(nx.compose(n1, n2))
+                return True
         return False
 
     def path_between(self, graph, nodes, subgraphs):
@@ -174,22 +414,50 @@ class GraphFormulaPatternMatcher:
         for n1, n2 in product(node1_matches, node2_matches):
             n1_root = [n for n, d in n1.in_degree() if d == 0][0]
             n2_root = [n for n, d in n2.in_degree() if d == 0][0]
-            try:
-                if nx.has_path(graph, n1_root, n2_root):
-                    subgraphs.append(nx.compose(n1, n2))
-                    return True
-            except:
-                continue
+            if self.is_within_distance(graph, n1_root, n2_root):
+                subgraphs.append(nx.compose(n1, n2))
+                return True
         return False
 
     def undirected(self, graph, nodes, subgraphs):
-        undirected_graph = graph.to_undirected().to_directed()
-        return self.path_between(undirected_graph, nodes, subgraphs)
+        if graph not in self.undirected_graphs:
+            self.undirected_graphs[graph] = graph.to_undirected().to_directed()
+        return self.path_between(self.undirected_graphs[graph], nodes, subgraphs)
+
+    def is_within_distance(self, graph, source, target, max_dist=None):
+        """Checks if target can be reached from source in at most max_dist
+        steps (any number if None). BFS results are kept for the rest of the
+        match() call and reused by all queries from the same source that
+        need the same or a smaller limit."""
+        cached = self.distances.get((graph, source))
+        if cached is None or not (
+            cached[0] is None or (max_dist is not None and max_dist <= cached[0])
+        ):
+            distances = nx.single_source_shortest_path_length(
+                graph, source, cutoff=max_dist
+            )
+            cached = max_dist, distances
+            self.distances[(graph, source)] = cached
+
+        distance = cached[1].get(target)
+        return distance is not None and (max_dist is None or distance <= max_dist)
+
+    def reset_graph_cache(self):
+        """forgets the labels, undirected versions and distances of graphs"""
+        self.host_labels = {}
+        self.undirected_graphs = {}
+        self.distances = {}
+
+    def get_compiled_matcher(self, graph, pattern):
+        return CompiledDiGraphMatcher(
+            graph,
+            pattern,
+            self.get_host_labels(graph),
+            self.pattern_tests[pattern],
+        )
 
     def digraph_matcher(self, graph, pattern, subgraphs):
-        matcher = GraphFormulaPatternMatcher.get_matcher(
-            graph, pattern, self.case_sensitive
-        )
+        matcher = self.get_compiled_matcher(graph, pattern)
 
         monomorphic_subgraphs = list(matcher.subgraph_monomorphisms_iter())
         if not len(monomorphic_subgraphs) == 0:
@@ -208,16 +476,17 @@ class GraphFormulaPatternMatcher:
                 if neg_graph[0](graph, neg_graph[1]):
                     return True
             else:
-                matcher = GraphFormulaPatternMatcher.get_matcher(
-                    graph, neg_graph, case_sensitive=self.case_sensitive
-                )
+                matcher = self.get_compiled_matcher(graph, neg_graph)
                 if matcher.subgraph_is_monomorphic():
                     return True
         return False
 
     def match(self, graph, return_subgraphs=False):
-        for i, (patt, negs, key) in enumerate(self.patts):
-            logger.debug(f"matching this: {self.patts[i]}")
+        self.reset_graph_cache()
+        for i in self.get_candidates(graph):
+            patt, negs, key = self.patts[i]
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"matching this: {self.patts[i]}")
             neg_match = self._neg_match(graph, negs)
 
             if not neg_match:
@@ -239,6 +508,26 @@ class GraphFormulaPatternMatcher:
                     else:
                         yield key, i
 
+    def _gen_corpus_matches(self, indexed_graphs):
+        for graph_idx, graph in indexed_graphs:
+            for key, i, subgraphs in self.match(graph, return_subgraphs=True):
+                yield graph_idx, key, i, subgraphs
+
+    def match_corpus(self, graphs, n_jobs=1, chunksize=100):
+        """Matches all patterns against an iterable of graphs, yielding
+        (graph_idx, key, pattern_idx, subgraphs) tuples in the order of the
+        graphs. With n_jobs other than 1, chunks of chunksize graphs are
+        matched in a pool of n_jobs processes (all cores if None), each
+        receiving a copy of the matcher once."""
+        indexed_graphs = enumerate(graphs)
+        if n_jobs == 1:
+            yield from self._gen_corpus_matches(indexed_graphs)
+            return
+
+        with Pool(n_jobs, initializer=_init_corpus_matcher, initargs=(self,)) as pool:
+            for matches in pool.imap(_match_chunk, chunks(indexed_graphs, chunksize)):
+                yield from matches
+
 
 def gen_subgraphs(M, no_edges):
     """M must be dict of dicts, see networkx.convert.to_dict_of_dicts.
@@ -270,6 +559,236 @@ def gen_subgraphs(M, no_edges):
                 yield new_graph
 
 
+def gen_connected_edge_sets(edges, no_edges):
+    """Generates the connected subgraphs of a graph with 1 to no_edges edges.
+    edges is a list of (u, v) pairs, each subgraph is yielded once as a
+    frozenset of indices into this list. Subgraphs are only extended by
+    edges touching their nodes."""
+    incident = {}
+    for i, (u, v) in enumerate(edges):
+        incident.setdefault(u, []).append(i)
+        incident.setdefault(v, []).append(i)
+
+    level = [frozenset([i]) for i in range(len(edges))]
+    for size in range(1, no_edges + 1):
+        yield from level
+        if size == no_edges:
+            return
+        next_level = set()
+        for edge_set in level:
+            nodes = {node for i in edge_set for node in edges[i]}
+            for node in nodes:
+                for i in incident[node]:
+                    if i not in edge_set:
+                        next_level.add(edge_set | {i})
+        level = list(next_level)
+
+
+PENMAN_TOKEN_PATT = re.compile(r"[()/]|:[^ \t\r\n\v\f\"()/:~]*|[^ \t\r\n\v\f\"()/:~]+")
+CONCEPT_ROLE = ":instance"
+
+
+def _parse_penman(string):
+    """Parses graphs of the form (var / concept :role (...) :role var), the
+    notation used by ALTO and by graph_to_pn. Returns the top and the
+    triples that penman.decode would produce, or None for anything else
+    (strings, alignments, comments, missing concepts, repeated variables)."""
+    if '"' in string or "~" in string or "#" in string:
+        return None
+    tokens = PENMAN_TOKEN_PATT.findall(string)
+    n_tokens = len(tokens)
+    triples, variables, inverted_attributes = [], set(), []
+    stack, role, top = [], None, None
+    pos = 0
+    while pos < n_tokens:
+        if not stack or role is not None:
+            # a node is expected: at the top or as the target of role
+            if tokens[pos] != "(" or pos + 3 >= n_tokens or tokens[pos + 2] != "/":
+                return None
+            var, concept = tokens[pos + 1], tokens[pos + 3]
+            if not _is_penman_symbol(var) or not _is_penman_symbol(concept):
+                return None
+            if var in variables or (top is not None and not stack):
+                return None
+            variables.add(var)
+            if stack:
+                if role.endswith("-of"):
+                    triples.append((var, role[:-3], stack[-1]))
+                else:
+                    triples.append((stack[-1], role, var))
+            else:
+                top = var
+            triples.append((var, CONCEPT_ROLE, concept))
+            stack.append(var)
+            role = None
+            pos += 4
+        elif tokens[pos] == ")":
+            stack.pop()
+            pos += 1
+        elif tokens[pos][0] == ":" and tokens[pos] not in (":", CONCEPT_ROLE):
+            if pos + 1 == n_tokens:
+                return None
+            if tokens[pos + 1] == "(":
+                role = tokens[pos]
+                pos += 1
+            elif _is_penman_symbol(tokens[pos + 1]):
+                if tokens[pos].endswith("-of"):
+                    inverted_attributes.append(len(triples))
+                triples.append((stack[-1], tokens[pos], tokens[pos + 1]))
+                pos += 2
+            else:
+                return None
+        else:
+            return None
+
+    if top is None or stack:
+        return None
+
+    for i in inverted_attributes:
+        source, role, target = triples[i]
+        if target in variables:
+            triples[i] = (target, role[:-3], source)
+
+    return top, triples
+
+
+def _is_penman_symbol(token):
+    return token not in ("(", ")", "/") and token[0] != ":"
+
+
+def decode_penman(string):
+    """Returns the top, the instances and the edges of a PENMAN graph, as
+    penman.decode would, without using penman for the usual notation"""
+    parsed = _parse_penman(string)
+    if parsed is None:
+        g = pn.decode(string)
+        return g.top, g.instances(), g.edges()
+
+    top, triples = parsed
+    variables = {source for source, _, _ in triples}
+    instances = [t for t in triples if t[1] == CONCEPT_ROLE]
+    edges = [t for t in triples if t[1] != CONCEPT_ROLE and t[2] in variables]
+    return top, instances, edges
+
+
+def _invert_penman_role(role):
+    return role[:-3] if role.endswith("-of") else role + "-of"
+
+
+def _configure_penman_node(var, data, nodemap):
+    """penman.layout._configure_node for graphs without epigraph data"""
+    node = nodemap[var]
+    edges = node[1]
+    surprising = False
+    while data:
+        triple = data.pop()
+        if triple[0] == var:
+            _, role, target = triple
+        elif triple[2] == var and triple[1] != CONCEPT_ROLE:
+            role, target = _invert_penman_role(triple[1]), triple[0]
+            surprising = True
+        else:
+            data.append(triple)
+            surprising = True
+            break
+
+        if role == CONCEPT_ROLE:
+            if target:
+                edges.insert(0, ("/", target))
+        else:
+            if target in nodemap and nodemap[target] is None:
+                nodemap[target] = node
+            edges.append((role, target))
+    return node, surprising
+
+
+def _find_next_penman_node(data, nodemap):
+    """penman.layout._find_next"""
+    var = None
+    for i in range(len(data) - 1, -1, -1):
+        source, _, target = data[i]
+        if source in nodemap and _establish_penman_site(source, nodemap):
+            var = source
+            break
+        elif target in nodemap and _establish_penman_site(target, nodemap):
+            var = target
+            break
+    pivot = i + 1
+    return data[pivot:], var, data[:pivot]
+
+
+def _establish_penman_site(var, nodemap):
+    """penman.layout._get_or_establish_site"""
+    if nodemap[var] is None:
+        return False
+    _var, edges = nodemap[var]
+    if var != _var:
+        node = (var, [])
+        nodemap[var] = node
+        for i, (role, target) in enumerate(edges):
+            if target == var and role != "/":
+                edges[i] = (role, node)
+                break
+    return True
+
+
+def _format_penman_node(node):
+    """penman's formatting of a tree node with indent=0"""
+    var, edges = node
+    if not var:
+        return "()"
+    if not edges:
+        return f"({var!s})"
+
+    parts = []
+    for role, target in edges:
+        if role != "/" and not role.startswith(":"):
+            role = ":" + role
+        if not target:
+            parts.append(role)
+        elif isinstance(target, tuple):
+            parts.append(f"{role} {_format_penman_node(target)}")
+        else:
+            parts.append(f"{role} {target!s}")
+    return f"({var!s} " + "\n".join(parts) + ")"
+
+
+def encode_penman(triples):
+    """Returns pn.encode(pn.Graph(triples), indent=0), laying out the tree
+    the same way as penman, which is only called if that fails"""
+    triples = [
+        (source, role if role.startswith(":") else ":" + role, target)
+        for source, role, target in triples
+    ]
+    if not triples:
+        return _format_penman_node((None, []))
+
+    top = triples[0][0]
+    nodemap = {source: None for source, _, _ in triples}
+    nodemap[top] = (top, [])
+    data = list(reversed(triples))
+    node, _ = _configure_penman_node(top, data, nodemap)
+    skipped = []
+    while data:
+        _skipped, var, data = _find_next_penman_node(data, nodemap)
+        skipped.extend(_skipped)
+        data_count = len(data)
+        if var is None or data_count == 0:
+            return pn.encode(pn.Graph(triples), indent=0)
+        _, surprising = _configure_penman_node(var, data, nodemap)
+        if len(data) == data_count and surprising:
+            skipped.insert(0, data.pop())
+        elif len(data) >= data_count:
+            return pn.encode(pn.Graph(triples), indent=0)
+        else:
+            data = skipped + data
+            skipped.clear()
+    if skipped:
+        return pn.encode(pn.Graph(triples), indent=0)
+
+    return _format_penman_node(node)
+
+
 def pn_to_graph(raw_dl, edge_attr="color"):
     """Convert penman to networkx format
     raw_dl: raw string of penman format
@@ -277,12 +796,12 @@ def pn_to_graph(raw_dl, edge_attr="color"):
     edges marked with k_* are mapped to UD nodes, u_* are unknown in UD
     """
 
-    g = pn.decode(raw_dl)
+    _, instances, edges = decode_penman(raw_dl)
     G = nx.DiGraph()
     node_to_id = {}
     root_id = None
 
-    for i, trip in enumerate(g.instances()):
+    for i, trip in enumerate(instances):
         node_id, name = trip[0], trip[2]
 
         node_to_id[node_id] = i
@@ -304,7 +823,7 @@ def pn_to_graph(raw_dl, edge_attr="color"):
         else:
             raise ValueError("Unknown indicator")
 
-    for trip in g.edges():
+    for trip in edges:
         edge = trip[1].split(":")[1]
         if "-" in edge:
             assert edge.endswith("-of")
@@ -348,11 +867,9 @@ def graph_to_pn(graph):
             nodes[node] = (pn_id, name)
             pn_nodes.append((pn_id, ":instance", name))
 
-    G = pn.Graph(pn_nodes + pn_edges)
-
     try:
         # two spaces before edge name, because alto does it :)
-        return pn.encode(G, indent=0).replace("\n", "  ")
+        return encode_penman(pn_nodes + pn_edges).replace("\n", "  ")
     except pn.exceptions.LayoutError as e:
         words = [graph.nodes[node]["name"] for node in graph.nodes()]
         logging.error(f"pn.encode failed on this graph: {words}")
@@ -374,18 +891,18 @@ def postprocess_penman(graph_string):
         graph_string (str): the input graph
     """
 
-    g = pn.decode(graph_string)
+    top, g_instances, g_edges = decode_penman(graph_string)
 
     instances = {}
     relabel = {}
 
-    for i in g.instances():
+    for i in g_instances:
         if i[2] and "_" in i[2]:
             ud_id = i[2].split("_")[-1]
             label = "_".join(i[2].split("_")[:-1])
             if ud_id.isnumeric():
                 new_id = f"k_{ud_id}"
-                if g.top == i[0]:
+                if top == i[0]:
                     new_id += "<root>"
                 instances[new_id] = label
                 relabel[i[0]] = new_id
@@ -396,7 +913,7 @@ def postprocess_penman(graph_string):
 
     edges = []
 
-    for edge in g.edges():
+    for edge in g_edges:
         src = relabel[edge[0]] if edge[0] in relabel else edge[0]
         tgt = relabel[edge[2]] if edge[2] in relabel else edge[2]
 
@@ -404,7 +921,7 @@ def postprocess_penman(graph_string):
 
     nodes = [(k, ":instance", v) for k, v in instances.items()]
 
-    return pn.encode(pn.Graph(nodes + edges), indent=0).replace("\n", "  ")
+    return encode_penman(nodes + edges).replace("\n", "  ")
 
 
 def read_alto_output(raw_dl):
@@ -455,17 +972,51 @@ def preprocess_edge_alto(edge):
     return edge.replace(":", "_").upper()
 
 
+ALTO_NODE_REPLACEMENTS = (
+    CHAR_REPLACEMENTS,
+    PUNCT_REPLACEMENTS,
+    MISC_REPLACEMENTS,
+)
+
+
+def replace_sequentially(string, replacement_dicts=ALTO_NODE_REPLACEMENTS):
+    """applies each replacement in turn, in the order of the dicts"""
+    for replacements in replacement_dicts:
+        for a, b in replacements.items():
+            string = string.replace(a, b)
+    return string
+
+
+def compile_replacements(replacement_dicts=ALTO_NODE_REPLACEMENTS):
+    """Returns a translation table and a pattern of multi-character keys
+    (or None) that together do the same as replace_sequentially. Multi-character
+    keys are only kept if the single-character replacements don't already
+    produce the same output for them (e.g. "§§")."""
+    keys = [a for replacements in replacement_dicts for a in replacements]
+    table = str.maketrans(
+        {a: replace_sequentially(a, replacement_dicts) for a in keys if len(a) == 1}
+    )
+    multi_char = {
+        a: replace_sequentially(a, replacement_dicts) for a in keys if len(a) > 1
+    }
+    multi_char = {a: b for a, b in multi_char.items() if b != a.translate(table)}
+    if not multi_char:
+        return table, None, multi_char
+    patt = re.compile(
+        "|".join(re.escape(a) for a in sorted(multi_char, key=len, reverse=True))
+    )
+    return table, patt, multi_char
+
+
+ALTO_NODE_TABLE, ALTO_NODE_PATT, ALTO_NODE_MULTI_CHAR = compile_replacements()
+
+
+@lru_cache(maxsize=65536)
 def preprocess_node_alto(edge):
-    # import sys
-    # sys.stderr.write(f'prepr_node_alto IN: {edge}\t')
     out = edge
-    for a, b in chain(
-        CHAR_REPLACEMENTS.items(), PUNCT_REPLACEMENTS.items(), MISC_REPLACEMENTS.items()
-    ):
-        out = out.replace(a, b)
-    # sys.stderr.write(f'replace_emojis IN: {out}\t')
-    out = replace_emojis(out)
-    # sys.stderr.write(f'OUT: {out}\n')
+    if ALTO_NODE_PATT is not None:
+        out = ALTO_NODE_PATT.sub(lambda m: ALTO_NODE_MULTI_CHAR[m.group()], out)
+    out = replace_emojis(out.translate(ALTO_NODE_TABLE))
     if out[0].isdigit():
         out = "X" + out
     return out
@@ -3,6 +3,7 @@ import os
 import stanza
 
 from tuw_nlp import logger
+from tuw_nlp.common.utils import chunks
 from tuw_nlp.grammar.text_to_4lang import TextTo4lang
 from tuw_nlp.graph.lexical import LexGraphs
 from tuw_nlp.graph.utils import graph_to_pn
@@ -17,7 +18,7 @@ class Featurizer:
         self.lang = lang
         self.preproc = Preprocessor(preprocessor)
 
-    def gen_events(self, iterable):
+    def gen_events(self, iterable, batch_size=32):
         raise NotImplementedError
 
     def get_feat_name(self, feat):
@@ -29,41 +30,48 @@ class TFLFeaturizer(Featurizer):
         super(TFLFeaturizer, self).__init__(*args, **kwargs)
 
         self.lexgraphs = LexGraphs()
+        # kept in nlp_cache.json.db, old JSON caches are imported from here
         self.nlp_cache = os.path.join(self.cache_dir, "nlp_cache.json")
 
     def get_features(self, fl, tfl):
-        features = set()
-        for sg_tuple, sg in self.lexgraphs.gen_lex_subgraphs(fl, 2):
-            features.add(sg_tuple)
-            self.feat_names[sg_tuple] = graph_to_pn(sg)
-        return list(features)
-
-    def gen_events(self, iterable):
+        features = list(self.lexgraphs.gen_lex_subgraph_tuples(fl.G, 2))
+        for sg_tuple in features:
+            if sg_tuple not in self.feat_names:
+                sg = self.lexgraphs.from_tuple(sg_tuple)
+                self.feat_names[sg_tuple] = graph_to_pn(sg)
+        return features
+
+    def gen_events(self, iterable, batch_size=32):
         with TextTo4lang(
             lang=self.lang, nlp_cache=self.nlp_cache, cache_dir=self.cache_dir
         ) as tfl:
 
-            for raw_text, label in iterable:
-                text = self.preproc(raw_text)
-                features = []
-                try:
-                    for fl in tfl(text):
-                        features += self.get_features(fl, tfl)
-                except TypeError:
-                    logger.error(f"tfl error on this text: {text}")
+            for batch in chunks(iterable, batch_size):
+                texts = [self.preproc(raw_text) for raw_text, _ in batch]
+                fl_lists = tfl.pipe(texts, batch_size=batch_size)
+                for text, (_, label), fls in zip(texts, batch, fl_lists):
+                    features = []
+                    if fls is None:
+                        logger.error(f"tfl error on this text: {text}")
+                    else:
+                        for fl in fls:
+                            features += self.get_features(fl, tfl)
 
-                yield features, label
+                    yield features, label
 
 
 class SimpleFeaturizer(Featurizer):
     def __init__(self, *args, **kwargs):
         super(SimpleFeaturizer, self).__init__(*args, **kwargs)
+        # kept in nlp_cache.json.db, old JSON caches are imported from here
         self.nlp_cache = os.path.join(self.cache_dir, "nlp_cache.json")
         self.nlp_init = lambda: stanza.Pipeline(lang=self.lang)
 
     def get_features(self, raw_text, nlp):
         text = self.preproc(raw_text)
-        doc = nlp(text)
+        return self.get_doc_features(nlp(text))
+
+    def get_doc_features(self, doc):
         feats = set()
         for sen in doc.sentences:
             for tok in sen.words:
@@ -74,12 +82,13 @@ class SimpleFeaturizer(Featurizer):
 
         return list(feats)
 
-    def gen_events(self, iterable):
+    def gen_events(self, iterable, batch_size=32):
         with CachedStanzaPipeline(None, self.nlp_cache, init=self.nlp_init) as nlp:
-            for raw_text, label in iterable:
-                text = self.preproc(raw_text)
-                features = self.get_features(text, nlp)
-                yield features, label
+            for batch in chunks(iterable, batch_size):
+                texts = [self.preproc(raw_text) for raw_text, _ in batch]
+                docs = nlp.pipe(texts, batch_size=batch_size)
+                for (_, label), doc in zip(batch, docs):
+                    yield self.get_doc_features(doc), label
 
 
 def get_featurizer(method, cache_dir="cache", lang=None, preprocessor=None):
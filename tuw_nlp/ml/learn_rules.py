@@ -5,7 +5,11 @@ from tqdm import tqdm
 
 from tuw_nlp.common.eval import print_cat_stats
 from tuw_nlp.ml.featurizer import get_featurizer
-from tuw_nlp.ml.rule_learner import RuleLearner
+from tuw_nlp.ml.rule_learner import (
+    RuleLearner,
+    print_prefix_curve,
+    write_prefix_curve_csv,
+)
 
 
 def get_args():
@@ -18,6 +22,7 @@ def get_args():
     parser.add_argument("-l", "--lang", default=None, type=str)
     parser.add_argument("-p", "--preprocessor", default=None, type=str)
     parser.add_argument("-i", "--inverse", action="store_true")
+    parser.add_argument("-c", "--curve-file", default=None, type=str)
     return parser.parse_args()
 
 
@@ -87,14 +92,8 @@ def main():
     with open("rules.txt", "w") as f:
         for rule in rules_sorted[:1000]:
             rule_name = featurizer.get_feat_name(rl.features.get_word(rule))
-            train_matches = rl.match(set([rule]), rl.train_events)
-            valid_matches = rl.match(set([rule]), rl.valid_events)
-            train_stats = {
-                m_type: len(samples) for m_type, samples in train_matches.items()
-            }
-            valid_stats = {
-                m_type: len(samples) for m_type, samples in valid_matches.items()
-            }
+            train_stats = rl.count([rule], rl.train_events)
+            valid_stats = rl.count([rule], rl.valid_events)
             print_cat_stats({rule_name: train_stats}, out_stream=f, linesep="")
             f.write("\t")
             print_cat_stats({rule_name: valid_stats}, out_stream=f, linesep="")
@@ -105,10 +104,11 @@ def main():
 
     # for n in range(500, 2000, 100):
     # for n in (10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000):
-    for n in (1, 3, 5, 10, 20, 30, 40, 50, 100, 200, 500, 1000, 2000, 5000):
-        rules = rules_sorted[:n]
-        print(n)
-        rl.eval_rules(rules)
+    ns = (1, 3, 5, 10, 20, 30, 40, 50, 100, 200, 500, 1000, 2000, 5000)
+    curve = rl.eval_prefix_curve(rules_sorted, ns)
+    print_prefix_curve(curve)
+    if args.curve_file is not None:
+        write_prefix_curve_csv(curve, args.curve_file)
 
 
 if __name__ == "__main__":
@@ -1,12 +1,74 @@
+import csv
+import sys
 from collections import Counter
 
 import numpy as np
 from sklearn.linear_model import LogisticRegression
+from tabulate import tabulate
 
-from tuw_nlp.common.eval import print_cat_stats
+from tuw_nlp.common.eval import count_p_r_f, print_cat_stats
 from tuw_nlp.common.vocabulary import Vocabulary
 from tuw_nlp.ml.utils import get_x_y
 
+CURVE_FIELDS = ("n", "TP", "FP", "TN", "FN", "P", "R", "F")
+
+
+def print_prefix_curve(curve, out_stream=sys.stdout, tablefmt="github"):
+    out_stream.write(
+        tabulate(
+            [[row[field] for field in CURVE_FIELDS] for row in curve],
+            headers=CURVE_FIELDS,
+            tablefmt=tablefmt,
+            floatfmt=".2%",
+        )
+    )
+    out_stream.write("\n")
+
+
+def write_prefix_curve_csv(curve, fn):
+    with open(fn, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CURVE_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(curve)
+
+
+class EventIndex:
+    """Postings index of a list of events.
+
+    For each feature the ids of the events containing it are stored in a
+    column of a sparse CSC matrix, so the events matched by a set of rules
+    can be found without looking at any other event.
+    """
+
+    def __init__(self, events, n_feats):
+        self.events = events
+        self.n_events = len(events)
+        X, y = get_x_y(events, range(n_feats), dtype=bool)
+        self.postings = X.tocsc()
+        self.labels = y.astype(bool)
+        self.n_positive = int(np.count_nonzero(self.labels))
+
+    def is_valid(self, events):
+        return events is self.events and len(events) == self.n_events
+
+    def get_postings(self, feat):
+        if feat >= self.postings.shape[1]:
+            return self.postings.indices[:0]
+        start, end = self.postings.indptr[feat : feat + 2]
+        return self.postings.indices[start:end]
+
+    def get_mask(self, rules):
+        mask = np.zeros(self.n_events, dtype=bool)
+        for rule in rules:
+            mask[self.get_postings(rule)] = True
+        return mask
+
+    def count(self, mask):
+        tp = int(np.count_nonzero(mask & self.labels))
+        fp = int(np.count_nonzero(mask)) - tp
+        fn = self.n_positive - tp
+        return {"TP": tp, "FP": fp, "TN": self.n_events - tp - fp - fn, "FN": fn}
+
 
 class RuleLearner:
     def __init__(self, args):
@@ -14,6 +76,7 @@ class RuleLearner:
         self.train_events = []
         self.valid_events = []
         self.feat_count = {True: Counter(), False: Counter(), "total": Counter()}
+        self.indices = {}
 
     def add_train_event(self, features, label):
         event = set(), label
@@ -46,6 +109,7 @@ class RuleLearner:
 
         self.train_events = self._cutoff_events(self.train_events)
         self.valid_events = self._cutoff_events(self.valid_events)
+        self.indices = {}
 
     def logreg_choice(self):
         logreg = LogisticRegression(max_iter=500)
@@ -73,23 +137,62 @@ class RuleLearner:
     def get_rule_names(self, rules):
         return [self.features.get_word(i) for i in rules]
 
+    def get_index(self, events):
+        """return the index of a list of events, (re)building it if needed"""
+        index = self.indices.get(id(events))
+        if index is None or not index.is_valid(events):
+            index = EventIndex(events, len(self.features))
+            self.indices[id(events)] = index
+        return index
+
     def eval_rules(self, rules):
-        matches = self.match(rules, self.valid_events)
-        stats = {m_type: len(samples) for m_type, samples in matches.items()}
+        stats = self.count(rules, self.valid_events)
         print_cat_stats({"True": stats})
 
+    def eval_prefix_curve(self, rules_sorted, ns, events=None):
+        """Evaluate the top n rules for each n in ns in a single pass.
+
+        Events are marked once they are matched, so each rule only adds the
+        events it matches first. Returns a list of rows with the fields of
+        CURVE_FIELDS, sorted by n. Uses the validation events by default.
+        """
+        if events is None:
+            events = self.valid_events
+        index = self.get_index(events)
+        matched = np.zeros(index.n_events, dtype=bool)
+        tp, pred, start = 0, 0, 0
+        curve = []
+        for n in sorted(ns):
+            for rule in rules_sorted[start:n]:
+                ids = index.get_postings(rule)
+                new_ids = ids[~matched[ids]]
+                matched[new_ids] = True
+                pred += len(new_ids)
+                tp += int(np.count_nonzero(index.labels[new_ids]))
+            start = max(start, n)
+
+            fn = index.n_positive - tp
+            tn = index.n_events - pred - fn
+            stats = {"TP": tp, "FP": pred - tp, "TN": tn, "FN": fn}
+            curve.append({"n": n, **count_p_r_f({n: stats})[n]})
+
+        return curve
+
+    def count(self, rules, events):
+        """return the number of TP, FP, TN and FN events for a set of rules"""
+        index = self.get_index(events)
+        return index.count(index.get_mask(rules))
+
     def match(self, rules, events):
-        matches = {match_type: set() for match_type in ("TP", "FP", "TN", "FN")}
-        for i, (feats, label) in enumerate(events):
-            # if feats.issubset(rules):
-            if feats.intersection(rules):
-                if label:
-                    matches["TP"].add(i)
-                else:
-                    matches["FP"].add(i)
-            else:
-                if label:
-                    matches["FN"].add(i)
-                else:
-                    matches["TN"].add(i)
-        return matches
+        index = self.get_index(events)
+        mask = index.get_mask(rules)
+        labels = index.labels
+        return {
+            match_type: set(np.flatnonzero(m).tolist())
+            for match_type, m in (
+                ("TP", mask & labels),
+                ("FP", mask & ~labels),
+                ("TN", ~mask & ~labels),
+                ("FN", ~mask & labels),
+            )
+        }
@@ -1,14 +1,30 @@
+from itertools import chain
+
 import numpy as np
+from scipy.sparse import csr_matrix
+
 
+def get_x_y(events, feat_vocab, dtype=np.float64):
+    """Return a sparse event-feature matrix and a vector of labels.
 
-def get_x_y(events, feat_vocab):
-    X = np.zeros((len(events), len(feat_vocab)))
-    y = np.zeros(len(events))
-    for i, event in enumerate(events):
-        for feat in event[0]:
-            X[i][feat] = 1
+    Use e.g. dtype=np.int8 or dtype=bool for a more compact binary matrix.
+    """
+    lengths = np.fromiter(
+        (len(feats) for feats, _ in events), dtype=np.int64, count=len(events)
+    )
+    indptr = np.zeros(len(events) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.fromiter(
+        chain.from_iterable(feats for feats, _ in events),
+        dtype=np.int64,
+        count=indptr[-1],
+    )
+    data = np.ones(len(indices), dtype=dtype)
+    X = csr_matrix((data, indices, indptr), shape=(len(events), len(feat_vocab)))
+    X.sort_indices()
 
-        if event[1]:
-            y[i] = 1
+    y = np.fromiter(
+        (bool(label) for _, label in events), dtype=np.float64, count=len(events)
+    )
 
     return X, y
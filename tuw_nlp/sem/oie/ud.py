@@ -1,6 +1,4 @@
-from xpotato.dataset.utils import default_pn_to_graph
-
-from tuw_nlp.graph.utils import GraphFormulaPatternMatcher
+from tuw_nlp.sem.oie.utils import get_matcher
 
 
 PATTERNS = [
@@ -69,43 +67,52 @@ def graph_to_text(graph):
 
 
 def ud_to_triplets(graph):
-    for patt, pred_ids, args in PATTERNS:
-        # print('=====================')
-        # print('patt, pred_ids, args:', patt, pred_ids, args)
-        # print('=====================')
-        patterns = [([patt], [], True)]
-        matcher = GraphFormulaPatternMatcher(
-            patterns, default_pn_to_graph, case_sensitive=False
-        )
-        for key, patt, subgraphs in matcher.match(graph.G, return_subgraphs=True):
-            for subgraph in subgraphs:
-                # print('subgraph:', subgraph.nodes(data=True))
-                remaining_graph = graph.copy()
-                mapping = {
-                    data["mapping"]: node for node, data in subgraph.nodes(data=True)
-                }
-                arg_graphs = []
-                arg_heads_by_arg = []
-                all_heads = set()
-                for arg_ids in args:
-                    mapped_ids = [mapping[head_id] for head_id in arg_ids]
-                    arg_heads_by_arg.append(mapped_ids)
-                    all_heads |= set(mapped_ids)
-
-                pred_heads = [mapping[pred_id] for pred_id in pred_ids]
-                all_heads |= set(pred_heads)
-
-                for head_ids in arg_heads_by_arg:
-                    # print('remaining graph:', remaining_graph.str_nodes(), 'next arg head(s):', head_ids)
-                    arg_graph = get_chunk(head_ids, remaining_graph, all_heads)
-                    # print('arg graph:', arg_graph.tokens, arg_graph.str_nodes())
-                    arg_graphs.append(arg_graph)
-                    remaining_graph.remove_graph(arg_graph)
-
-                pred_graph = get_pred(pred_heads, graph, all_heads)
-                # print('pred graph:', pred_graph.tokens, pred_graph.str_nodes())
-                # remaining_graph.remove_graph(pred_graph)
-
-                yield graph_to_text(pred_graph), [
-                    graph_to_text(arg_graph) for arg_graph in arg_graphs
-                ]
+    matcher = get_matcher(tuple(PATTERNS))
+    for key, _, subgraphs in matcher.match(graph.G, return_subgraphs=True):
+        yield from gen_triplets(graph, key, subgraphs)
+
+
+def ud_corpus_to_triplets(graphs, n_jobs=1, chunksize=100):
+    """yields (graph_idx, triplet) pairs for a list of UD graphs, see
+    GraphFormulaPatternMatcher.match_corpus"""
+    matches = get_matcher(tuple(PATTERNS)).match_corpus(
+        [graph.G for graph in graphs], n_jobs=n_jobs, chunksize=chunksize
+    )
+    for graph_idx, key, _, subgraphs in matches:
+        for triplet in gen_triplets(graphs[graph_idx], key, subgraphs):
+            yield graph_idx, triplet
+
+
+def gen_triplets(graph, key, subgraphs):
+    _, pred_ids, args = PATTERNS[key]
+    for subgraph in subgraphs:
+        # print('subgraph:', subgraph.nodes(data=True))
+        remaining_graph = graph.copy()
+        mapping = {
+            data["mapping"]: node for node, data in subgraph.nodes(data=True)
+        }
+        arg_graphs = []
+        arg_heads_by_arg = []
+        all_heads = set()
+        for arg_ids in args:
+            mapped_ids = [mapping[head_id] for head_id in arg_ids]
+            arg_heads_by_arg.append(mapped_ids)
+            all_heads |= set(mapped_ids)
+
+        pred_heads = [mapping[pred_id] for pred_id in pred_ids]
+        all_heads |= set(pred_heads)
+
+        for head_ids in arg_heads_by_arg:
+            # print('remaining graph:', remaining_graph.str_nodes(), 'next arg head(s):', head_ids)
+            arg_graph = get_chunk(head_ids, remaining_graph, all_heads)
+            # print('arg graph:', arg_graph.tokens, arg_graph.str_nodes())
+            arg_graphs.append(arg_graph)
+            remaining_graph.remove_graph(arg_graph)
+
+        pred_graph = get_pred(pred_heads, graph, all_heads)
+        # print('pred graph:', pred_graph.tokens, pred_graph.str_nodes())
+        # remaining_graph.remove_graph(pred_graph)
+
+        yield graph_to_text(pred_graph), [
+            graph_to_text(arg_graph) for arg_graph in arg_graphs
+        ]
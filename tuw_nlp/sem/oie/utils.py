@@ -0,0 +1,16 @@
+from functools import lru_cache
+
+from xpotato.dataset.utils import default_pn_to_graph
+
+from tuw_nlp.graph.utils import GraphFormulaPatternMatcher
+
+
+@lru_cache(maxsize=None)
+def get_matcher(patterns):
+    """a single matcher for a tuple of patterns, each given as a tuple whose
+    first element is the pattern string, the key of each pattern is its index"""
+    return GraphFormulaPatternMatcher(
+        [([patt[0]], [], i) for i, patt in enumerate(patterns)],
+        default_pn_to_graph,
+        case_sensitive=False,
+    )
@@ -1,24 +1,111 @@
+import argparse
+import json
+import logging
 import os
 import re
 from collections import defaultdict
+from multiprocessing import Pool
 
 from nltk.corpus import stopwords as nltk_stopwords
 
+from tuw_nlp import logger
+from tuw_nlp.common.kvstore import KVStore
+from tuw_nlp.common.utils import chunks
 from tuw_nlp.graph.utils import preprocess_node_alto
 
+# boilerplate stripped from the start of definitions, each at most once and
+# in this order
+DEFINITION_PREFIXES = (
+    "A type of",
+    "Something that",
+    "Relating to",
+    "Someone who",
+    "Of or",
+    "Any of",
+    "The act of",
+    "A group of",
+    "The part of",
+    "One of the",
+    "Used to",
+    "An attempt to",
+    "intransitive",
+    "ditransitive",
+    "ambitransitive",
+    "transitive",
+    "uncountable",
+    "countable",
+    "pulative ",
+    ". ",
+)
+DEFINITION_PREFIX_PATT = re.compile("|".join(map(re.escape, DEFINITION_PREFIXES)))
+
+
+def parse_definition(defi):
+    defi = defi.replace("#", " ").strip()
+
+    if DEFINITION_PREFIX_PATT.match(defi):
+        for prefix in DEFINITION_PREFIXES:
+            if defi.startswith(prefix):
+                defi = defi[len(prefix) :]
+
+    defi_words = defi.split(" ")
+    first_words = defi_words[0].split(",")
+    if len(first_words) > 1 and first_words[0].lower().replace("'s", "") == first_words[
+        1
+    ].lower().replace("'s", ""):
+        defi = " ".join([first_words[1]] + defi_words[1:])
+    return defi
+
+
+def parse_line(line):
+    """Returns the headword and the parsed definition of a line of a
+    definitions file, or None if the definition is too short"""
+    line = line.split("\t")
+    defi = line[2].strip().strip("\n")
+    if len(defi) <= 5:
+        return None
+    return line[0].strip(), parse_definition(defi)
+
+
+def _parse_lines(lines):
+    return [parse_line(line) for line in lines]
+
+
+def parse_definitions_bulk(lines, n_jobs=1, chunksize=10000):
+    """Yields parse_line of each line, in order. With n_jobs other than 1,
+    chunks of chunksize lines are parsed in a pool of n_jobs processes (all
+    cores if None)."""
+    if n_jobs == 1:
+        yield from map(parse_line, lines)
+        return
+
+    with Pool(n_jobs) as pool:
+        for parsed in pool.imap(_parse_lines, chunks(lines, chunksize)):
+            yield from parsed
+
+
+def get_definitions_fn(lang):
+    return os.path.join(
+        os.path.expanduser("~/tuw_nlp_resources"), "definitions", lang.split("_")[0]
+    )
+
+
+def get_index_fn(definitions_fn):
+    return f"{definitions_fn}.db"
+
 
 class Dictionary:
+    """Definitions of headwords, looked up in a SQLite index that is built
+    from the definitions file on first use and opened lazily."""
+
     def __init__(self, lang):
-        self.lexicon = defaultdict(list)
         self.lang_map = {}
         base_fn = os.path.dirname(os.path.abspath(__file__))
         langnames_fn = os.path.join(base_fn, "langnames")
 
         self.lang = lang
 
-        definitions_base_fn = os.path.join(
-            os.path.expanduser("~/tuw_nlp_resources"), "definitions", lang.split("_")[0]
-        )
+        definitions_base_fn = get_definitions_fn(lang)
 
         definitions_fn = None
         if os.path.isfile(definitions_base_fn):
@@ -34,57 +121,87 @@ class Dictionary:
                 self.lang_map[line[0]] = line[1].strip("\n")
 
         self.stopwords = set(nltk_stopwords.words(self.lang_map[lang]))
-        self.__init_lexicons(definitions_fn)
+        self.definitions_fn = definitions_fn
+        self.index_fn = get_index_fn(definitions_fn)
+        self.index = None
 
-    def __init_lexicons(self, definitions_fn):
+    def read_lexicon(self, definitions_fn, n_jobs=1):
+        lexicon = defaultdict(list)
         with open(definitions_fn, "r", encoding="utf8") as f:
-            for line in f:
-                line = line.split("\t")
-                if len(line[2].strip().strip("\n")) > 5:
-                    word = line[0].strip()
-
-                    defi = line[2].strip().strip("\n")
-                    defi = self.parse_definition(defi)
-                    if defi.strip() != word:
-                        def_splitted = defi.strip().split(";")
-                        for def_split in def_splitted:
-                            if def_split not in self.lexicon[word]:
-                                self.lexicon[word].append(def_split)
-                                self.lexicon[preprocess_node_alto(word)].append(
-                                    def_split
-                                )
+            for parsed in parse_definitions_bulk(f, n_jobs=n_jobs):
+                if parsed is None:
+                    continue
+                word, defi = parsed
+                if defi.strip() != word:
+                    def_splitted = defi.strip().split(";")
+                    for def_split in def_splitted:
+                        if def_split not in lexicon[word]:
+                            lexicon[word].append(def_split)
+                            lexicon[preprocess_node_alto(word)].append(def_split)
+        return lexicon
+
+    def index_is_current(self):
+        return os.path.isfile(self.index_fn) and os.path.getmtime(
+            self.index_fn
+        ) >= os.path.getmtime(self.definitions_fn)
+
+    def build_index(self, n_jobs=1):
+        """compile the definitions file into the SQLite index"""
+        logger.info(f"building definition index {self.index_fn}")
+        lexicon = self.read_lexicon(self.definitions_fn, n_jobs=n_jobs)
+        tmp_fn = f"{self.index_fn}.{os.getpid()}.tmp"
+        store = KVStore(tmp_fn, table="definitions")
+        store.update(
+            (word, json.dumps(definitions, ensure_ascii=False))
+            for word, definitions in lexicon.items()
+            if definitions
+        )
+        store.connect().execute("PRAGMA journal_mode=DELETE")
+        store.close()
+        os.replace(tmp_fn, self.index_fn)
+
+    def get_index(self):
+        if self.index is None:
+            if not self.index_is_current():
+                self.build_index()
+            self.index = KVStore(self.index_fn, table="definitions")
+        return self.index
+
+    def get_definitions(self, word):
+        definitions = self.get_index().get(word)
+        return [] if definitions is None else json.loads(definitions)
 
     def parse_definition(self, defi):
-        defi = re.sub(re.escape("#"), " ", defi).strip()
-
-        defi = re.sub(r"^A type of", "", defi)
-        defi = re.sub(r"^Something that", "", defi)
-        defi = re.sub(r"^Relating to", "", defi)
-        defi = re.sub(r"^Someone who", "", defi)
-        defi = re.sub(r"^Of or", "", defi)
-        defi = re.sub(r"^Any of", "", defi)
-        defi = re.sub(r"^The act of", "", defi)
-        defi = re.sub(r"^A group of", "", defi)
-        defi = re.sub(r"^The part of", "", defi)
-        defi = re.sub(r"^One of the", "", defi)
-        defi = re.sub(r"^Used to", "", defi)
-        defi = re.sub(r"^An attempt to", "", defi)
-
-        defi = re.sub(r"^intransitive", "", defi)
-        defi = re.sub(r"^ditransitive", "", defi)
-        defi = re.sub(r"^ambitransitive", "", defi)
-        defi = re.sub(r"^transitive", "", defi)
-        defi = re.sub(r"^uncountable", "", defi)
-        defi = re.sub(r"^countable", "", defi)
-        defi = re.sub(r"^pulative ", "", defi)
-        defi = re.sub(r"^\. ", "", defi)
-        defi_words = defi.split(" ")
-        first_words = defi_words[0].split(",")
-        if len(first_words) > 1 and re.sub("'s", "", first_words[0].lower()) == re.sub(
-            "'s", "", first_words[1].lower()
-        ):
-            defi = " ".join([first_words[1]] + defi_words[1:])
-        return defi
+        return parse_definition(defi)
 
     def get_definition(self, word):
-        return self.lexicon[word][0] if self.lexicon[word] else None
+        definitions = self.get_definitions(word)
+        return definitions[0] if definitions else None
+
+    def items(self):
+        """yield each headword with the definition returned by get_definition"""
+        for word, definitions in self.get_index().items():
+            yield word, json.loads(definitions)[0]
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="build the definition index of a language"
+    )
+    parser.add_argument("-l", "--lang", default="en", type=str)
+    parser.add_argument("-j", "--n-jobs", default=1, type=int)
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(
+        format="%(asctime)s : "
+        + "%(module)s (%(lineno)s) - %(levelname)s - %(message)s"
+    )
+    logging.getLogger().setLevel(logging.INFO)
+    args = get_args()
+    Dictionary(args.lang).build_index(n_jobs=args.n_jobs)
+
+
+if __name__ == "__main__":
+    main()
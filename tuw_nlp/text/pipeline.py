@@ -1,10 +1,48 @@
 import os
+import threading
+from functools import partial
 
 import stanza
+from stanza.models.common.doc import Document as StanzaDocument
 
 from tuw_nlp import logger
+from tuw_nlp.common.kvstore import KVStore
+from tuw_nlp.common.utils import chunks
 from tuw_nlp.text import segmentation  # noqa
-from tuw_nlp.text.utils import load_parsed, save_parsed
+from tuw_nlp.text.utils import (
+    deserialize_doc,
+    is_sqlite_file,
+    load_parsed,
+    serialize_doc,
+)
+
+# stanza pipelines used for UD parsing in each language
+LANG_PIPELINES = {
+    "de": {"lang": "de", "processors": "tokenize,mwt,pos,lemma,depparse"},
+    "en": {"lang": "en", "processors": "tokenize,mwt,pos,lemma,depparse"},
+    "en_bio": {"lang": "en", "package": "craft"},
+}
+
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+
+def get_pipeline(lang="de", processors=None, package="default"):
+    """Returns the CustomStanzaPipeline for (lang, processors, package). It is
+    built the first time it is requested and then shared by all callers in
+    the process, including worker processes forked after loading."""
+    key = (lang, processors, package)
+    with _pipelines_lock:
+        if key not in _pipelines:
+            logger.info(f"loading stanza pipeline {key}")
+            _pipelines[key] = CustomStanzaPipeline(lang, processors, package)
+        return _pipelines[key]
+
+
+def get_lazy_pipeline(lang="de", processors=None, package="default"):
+    """Returns a function that calls get_pipeline, e.g. for the init argument
+    of CachedStanzaPipeline, so that models are only loaded when needed"""
+    return partial(get_pipeline, lang, processors, package)
 
 
 class CustomStanzaPipeline:
@@ -36,11 +74,42 @@ class CustomStanzaPipeline:
         sens = self.ssplit(text)
         return self.additional("\n\n".join(sens))
 
+    def ssplit_batch(self, texts):
+        docs = self.tokenizer([StanzaDocument([], text=text) for text in texts])
+        return [[sen.text for sen in doc.sentences] for doc in docs]
+
+    def process_batch(self, texts):
+        """parse a list of texts with a single call to each stanza pipeline"""
+        if not texts:
+            return []
+        docs = [
+            StanzaDocument([], text="\n\n".join(sens))
+            for sens in self.ssplit_batch(texts)
+        ]
+        return self.additional(docs)
+
+    def pipe(self, texts, batch_size=32):
+        for batch in chunks(texts, batch_size):
+            yield from self.process_batch(batch)
+
     def __call__(self, text):
         return self.process(text)
 
 
 class CachedStanzaPipeline:
+    """Wraps a stanza pipeline with a persistent cache of parsed texts.
+
+    The cache is an SQLite file mapping each text to its compressed parse.
+    Documents are only built when a text is looked up and new parses are
+    written to disk immediately, so neither startup time nor memory use grow
+    with the size of the cache.
+
+    cache_path is used as the SQLite file itself, unless it is the name of a
+    JSON cache (an existing JSON file, or any path ending in .json). In that
+    case it is only the base name and the cache is kept in <cache_path>.db.
+    An existing JSON cache is imported into it the first time it is opened.
+    """
+
     def __init__(self, stanza_pipeline, cache_path, init=None):
         if stanza_pipeline is None:
             assert init is not None
@@ -48,15 +117,25 @@ class CachedStanzaPipeline:
         self.nlp = stanza_pipeline
         self.init = init
         self.cache_path = cache_path
-        if os.path.exists(self.cache_path):
-            logger.info(f"loading NLP cache from {self.cache_path}...")
-            self.parsed = load_parsed(self.cache_path)
-            logger.info("done!")
-        else:
-            self.parsed = {}
-            logger.info(f"creating new NLP cache in {self.cache_path}")
 
-        self.changed = False
+        legacy_path = None
+        if os.path.exists(cache_path):
+            if not is_sqlite_file(cache_path):
+                legacy_path = cache_path
+                self.cache_path = f"{cache_path}.db"
+        elif cache_path.endswith(".json"):
+            self.cache_path = f"{cache_path}.db"
+
+        is_new = not os.path.exists(self.cache_path)
+        logger.info(f"using NLP cache in {self.cache_path}")
+        self.parsed = KVStore(self.cache_path, table="nlp_cache")
+        if is_new and legacy_path is not None:
+            logger.info(f"importing NLP cache from {legacy_path}...")
+            self.parsed.update(
+                (text, serialize_doc(doc))
+                for text, doc in load_parsed(legacy_path).items()
+            )
+            logger.info("done!")
 
     def parse(self, text, ssplit):
         if self.nlp is None:
@@ -64,18 +143,51 @@ class CachedStanzaPipeline:
 
         return self.nlp(text) if ssplit else self.nlp.additional(text)
 
+    def parse_batch(self, texts, ssplit):
+        if self.nlp is None:
+            self.nlp = self.init()
+
+        if ssplit and hasattr(self.nlp, "process_batch"):
+            return self.nlp.process_batch(texts)
+
+        nlp = self.nlp if ssplit else self.nlp.additional
+        return nlp([StanzaDocument([], text=text) for text in texts])
+
+    def pipe(self, texts, ssplit=True, batch_size=32):
+        """Parse an iterable of texts, yielding one document per text.
+
+        Texts missing from the cache are parsed together, batch_size at a
+        time, so that stanza can process many sentences at once.
+        """
+        for batch in chunks(texts, batch_size):
+            docs = {}
+            for text in batch:
+                data = self.parsed.get(text)
+                if data is not None:
+                    docs[text] = deserialize_doc(data, text)
+
+            missing = list(dict.fromkeys(text for text in batch if text not in docs))
+            if missing:
+                parsed = self.parse_batch(missing, ssplit=ssplit)
+                docs.update(zip(missing, parsed))
+                self.parsed.update(
+                    (text, serialize_doc(doc)) for text, doc in zip(missing, parsed)
+                )
+
+            for text in batch:
+                yield docs[text]
+
     def __call__(self, text, ssplit=True):
-        if text not in self.parsed:
-            self.parsed[text] = self.parse(text, ssplit=ssplit)
-            self.changed = True
+        data = self.parsed.get(text)
+        if data is not None:
+            return deserialize_doc(data, text)
 
-        return self.parsed[text]
+        doc = self.parse(text, ssplit=ssplit)
+        self.parsed.put(text, serialize_doc(doc))
+        return doc
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
-        if self.changed:
-            logger.info(f"saving NLP cache to {self.cache_path}...")
-            save_parsed(self.parsed, self.cache_path)
-            logger.info("done!")
+        self.parsed.close()
@@ -1,4 +1,5 @@
 import json
+import zlib
 
 from stanza.models.common.doc import Document as StanzaDocument
 from stanza.utils.conll import CoNLL
@@ -66,6 +67,20 @@ def save_parsed(parsed, fn):
         json.dump({text: doc.to_dict() for text, doc in parsed.items()}, f)
 
 
+def is_sqlite_file(fn):
+    with open(fn, "rb") as f:
+        return f.read(16) == b"SQLite format 3\x00"
+
+
+def serialize_doc(doc):
+    """compact binary form of a StanzaDocument, see deserialize_doc"""
+    return zlib.compress(json.dumps(doc.to_dict()).encode("utf-8"))
+
+
+def deserialize_doc(data, text):
+    return StanzaDocument(json.loads(zlib.decompress(data).decode("utf-8")), text=text)
+
+
 def replace_emojis(text, with_what="EMOJI"):
     return EMOJI_PATT.sub(with_what, text)
 